@@ -0,0 +1,206 @@
+"""Accuracy Versus Speed Harness
+
+Runs each engine setting (the exact engines and the sampled engines at several time steps)
+and compares its collision points with references that do not share its approximations:
+
+    rectangle   collision points from unfolding the table (Table.rectangle_jump)
+    elliptical  the boundary equation and the conserved product of angular momenta about the foci
+    stadium     the analytic intersection steps evaluated in 100-digit decimal arithmetic
+
+For each setting it reports wall-clock time, collisions/sec and how the error grows with
+the collision index, so engine settings can be chosen by measured cost and accuracy. It also
+checks Table.rectangle_jump itself at indices up to 10^15 against exact rational arithmetic, and
+against the event-driven run for balls starting on walls and in corners.
+
+Usage: python benchmarks/accuracy.py [--collisions 10000] [--sampled-collisions 500] [--output accuracy.json]
+"""
+import argparse
+import decimal
+import json
+import math
+import os
+import sys
+import time
+from decimal import Decimal
+from fractions import Fraction
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src import ball, table, utils  # noqa: E402
+
+CASES = {"rectangle": [4, 3], "elliptical": [4, 3], "stadium": [2, 1]}
+START, ANGLE = [0.3, 0.1], 37.3
+SETTINGS = [("exact", None), ("sampled", 1e-2), ("sampled", 1e-3)]
+HORIZON_TOLERANCE = 1e-6  # An engine is trusted until its error first exceeds this
+REFERENCE_DIGITS = 100  # Significant figures carried by the stadium reference
+
+def simulate(geometry, reflections, exact, step):
+    billiards_table = table.Table(geometry, dims=CASES[geometry])
+    billiards_table.reflections = reflections
+    billiards_ball = ball.Ball(billiards_table, pos=START, angle=ANGLE)
+    calc = getattr(billiards_table, f"{geometry}_calc")
+    start = time.perf_counter()
+    if exact:
+        calc(billiards_ball)
+    else:
+        calc(billiards_ball, exact=False, step=step)
+    elapsed = time.perf_counter() - start
+    return np.array([np.asarray(c, dtype=float) for c in billiards_table.collisions]), elapsed, billiards_table, billiards_ball
+
+def rectangle_error(collisions, billiards_table, billiards_ball):
+    reference = billiards_table.rectangle_jump(billiards_ball, slice(0, collisions.shape[1]))
+    return np.hypot(*(collisions - reference))
+
+def rectangle_jump_reference(billiards_table, billiards_ball, index):
+    # The index-th collision in exact rational arithmetic, treating the float inputs as exact
+    half_width, half_height = (Fraction(float(d))/2 for d in billiards_table.dims)
+    vel_x, vel_y = Fraction(float(np.cos(np.radians(ANGLE)))), Fraction(float(np.sin(np.radians(ANGLE))))
+    x0, y0 = (Fraction(float(p)) for p in billiards_ball.init_pos)
+    to_side = half_width - (x0 if vel_x > 0 else -x0)
+    to_end = half_height - (y0 if vel_y > 0 else -y0)
+
+    def side_time(i):
+        return (to_side + 2*half_width*i)/abs(vel_x)
+
+    def collisions_before_side(i):  # Top/bottom hits strictly before side hit i count; sides win ties
+        return i + max(math.ceil((side_time(i)*abs(vel_y) - to_end)/(2*half_height)), 0)
+
+    # Bisect for the last side hit that is at most the wanted collision
+    n, low, high = index - 1, -1, index
+    while high - low > 1:
+        middle = (low + high)//2
+        low, high = (middle, high) if collisions_before_side(middle) <= n else (low, middle)
+    if low >= 0 and collisions_before_side(low) == n:
+        time_hit = side_time(low)
+    else:
+        time_hit = (to_end + 2*half_height*(n - low - 1))/abs(vel_y)
+
+    def fold(coord, half_length):
+        u = (coord + half_length) % (4*half_length)
+        return float((u if u <= 2*half_length else 4*half_length - u) - half_length)
+    return fold(x0 + vel_x*time_hit, half_width), fold(y0 + vel_y*time_hit, half_height)
+
+def deep_jump_error(indices=(10**3, 10**6, 10**9, 10**12, 10**15)):
+    billiards_table = table.Table("rectangle", dims=CASES["rectangle"])
+    billiards_ball = ball.Ball(billiards_table, pos=START, angle=ANGLE)
+    errors = {}
+    for index in indices:
+        reference = rectangle_jump_reference(billiards_table, billiards_ball, index)
+        errors[str(index)] = float(np.hypot(*(billiards_table.rectangle_jump(billiards_ball, index) - reference)))
+    print("rectangle_jump vs exact  " + "  ".join(f"k={k}: {v:.1e}" for k, v in errors.items()))
+    return errors
+
+# Starts on walls and in corners, (dims, pos, angle), including launches along a wall
+WALL_STARTS = [([1, 6], [-0.5, -0.2], 270), ([1, 6], [0.2, 3], 180), ([1, 1], [0.5, 0.5], 135),
+               ([1, 1], [0.5, 0.5], 45), ([3, 2], [1.5, 0.3], 33.3), ([3, 2], [1.5, 1], 225),
+               ([3, 2], [0.2, -1], -20), ([3, 2], [-1.5, 0.2], 180), ([3, 2], [0.4, 1], 90)]
+
+def wall_start_error(collisions=200):
+    # Largest gap between rectangle_jump and rectangle_calc over whole and negative slices
+    worst = 0.0
+    for dims, pos, angle in WALL_STARTS:
+        billiards_table = table.Table("rectangle", dims=dims)
+        billiards_table.reflections = collisions
+        billiards_table.max_period = 0  # Compare against the plain event-driven run
+        billiards_ball = ball.Ball(billiards_table, pos=pos, angle=angle)
+        billiards_table.rectangle_calc(billiards_ball)
+        engine = np.array(billiards_table.collisions)
+        for index in (slice(None), slice(-50, None), slice(None, None, -3)):
+            worst = max(worst, float(np.abs(billiards_table.rectangle_jump(billiards_ball, index) - engine[:, index]).max()))
+    print(f"rectangle_jump vs calc from walls and corners  max error {worst:.1e}")
+    return worst
+
+def elliptical_error(collisions, billiards_table, billiards_ball):
+    a, b = CASES["elliptical"]
+    focus = np.sqrt(a**2 - b**2)
+    x, y = collisions
+    boundary = np.abs((x/a)**2 + (y/b)**2 - 1)
+    vel = np.diff(collisions, axis=1)
+    vel_x, vel_y = vel/np.hypot(*vel)
+    # Product of the angular momenta about the two foci is conserved along the whole trajectory
+    invariant = ((x[:-1] - focus)*vel_y - y[:-1]*vel_x)*((x[:-1] + focus)*vel_y - y[:-1]*vel_x)
+    error = np.zeros(collisions.shape[1])
+    error[1:] = np.maximum(boundary[1:], np.append(np.abs(invariant[1:] - invariant[0]), 0))
+    return error
+
+def stadium_reference(reflections, digits=REFERENCE_DIGITS):
+    # The same analytic steps in decimal arithmetic carrying `digits` significant figures, from the
+    # engine's own float start; its rounding grows at the same rate as the engine's but from
+    # 10^-digits, so it stays far below the engine's error for many times the engine's horizon
+    with decimal.localcontext() as context:
+        context.prec = digits
+        half_width, end_radius = Decimal(CASES["stadium"][0])/2, Decimal(CASES["stadium"][1])/2
+        x, y = Decimal(START[0]), Decimal(START[1])
+        vel_x, vel_y = Decimal(float(np.cos(np.radians(ANGLE)))), Decimal(float(np.sin(np.radians(ANGLE))))
+        reference = np.empty((2, reflections + 1))
+        reference[:, 0] = x, y
+        for i in range(reflections):
+            speed_squared = vel_x**2 + vel_y**2  # Not exactly 1 for a float velocity
+            t, end_centre = None, None
+            if vel_y:
+                t_flat = ((end_radius if vel_y > 0 else -end_radius) - y)/vel_y
+                if t_flat > 0 and abs(x + vel_x*t_flat) <= half_width:
+                    t = t_flat
+            for centre in (half_width, -half_width):
+                rel_x = x - centre
+                half_b = rel_x*vel_x + y*vel_y
+                disc = half_b**2 - speed_squared*(rel_x**2 + y**2 - end_radius**2)
+                if disc < 0:
+                    continue
+                t_end = (disc.sqrt() - half_b)/speed_squared
+                if t_end > Decimal("1e-12") and (t is None or t_end < t) and (x + vel_x*t_end - centre)*centre >= 0:
+                    t, end_centre = t_end, centre
+            x, y = x + vel_x*t, y + vel_y*t
+            if end_centre is None:
+                y = end_radius if vel_y > 0 else -end_radius
+                vel_y = -vel_y
+            else:
+                dist = ((x - end_centre)**2 + y**2).sqrt()
+                norm_x, norm_y = (x - end_centre)/dist, y/dist
+                vel_norm = vel_x*norm_x + vel_y*norm_y
+                vel_x, vel_y = vel_x - 2*vel_norm*norm_x, vel_y - 2*vel_norm*norm_y
+            reference[:, i + 1] = x, y
+    return reference
+
+def report(geometry, exact, step, collisions, elapsed, error):
+    count = collisions.shape[1] - 1
+    beyond = np.nonzero(error > HORIZON_TOLERANCE)[0]
+    checkpoints = [k for k in (10, 100, 1000, 10000, 100000) if k <= count] + [count]
+    result = {
+        "geometry": geometry, "engine": "exact" if exact else f"sampled step={step:g}", "collisions": count,
+        "seconds": elapsed, "collisions_per_sec": count/elapsed if elapsed else float("inf"),
+        "error_at": {str(k): float(np.max(error[:k + 1])) for k in checkpoints},
+        "trusted_collisions": int(beyond[0] - 1) if len(beyond) else count,
+    }
+    growth = "  ".join(f"k={k}: {v:.1e}" for k, v in result["error_at"].items())
+    print(f"{geometry:10s} {result['engine']:20s} {result['collisions_per_sec']:>12,.0f} coll/s  "
+          f"trusted for {result['trusted_collisions']:>6d}  max error {growth}")
+    return result
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--collisions", type=int, default=10000, help="collisions for the exact engines")
+    parser.add_argument("--sampled-collisions", type=int, default=500, help="collisions for the (slow) sampled engines")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    args = parser.parse_args()
+    utils.ellipse_arc_length(0.0, 1.0, 1.0)  # Import scipy up front so it is not timed as part of an engine
+    stadium_ref = stadium_reference(max(args.collisions, args.sampled_collisions))
+    results = []
+    for geometry in CASES:
+        for engine, step in SETTINGS:
+            exact = engine == "exact"
+            reflections = args.collisions if exact else args.sampled_collisions
+            collisions, elapsed, billiards_table, billiards_ball = simulate(geometry, reflections, exact, step)
+            if geometry == "rectangle":
+                error = rectangle_error(collisions, billiards_table, billiards_ball)
+            elif geometry == "elliptical":
+                error = elliptical_error(collisions, billiards_table, billiards_ball)
+            else:
+                error = np.hypot(*(collisions - stadium_ref[:, :collisions.shape[1]]))
+            results.append(report(geometry, exact, step, collisions, elapsed, error))
+    jump_errors = deep_jump_error()
+    wall_error = wall_start_error()
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"engines": results, "rectangle_jump_error_at": jump_errors,
+                       "rectangle_jump_wall_start_error": wall_error}, f, indent=1)
@@ -0,0 +1,92 @@
+"""Collision Engine Benchmarks
+
+Measures collisions/sec, peak memory and phase-space cost of the exact rectangle, elliptical
+and stadium engines across table sizes and collision counts, writes the results as JSON and
+optionally compares them with a stored baseline.
+
+Usage:
+    python benchmarks/engines.py [--max-exponent 6] [--output results.json]
+                                 [--baseline benchmarks/baseline.json] [--tolerance 0.2]
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src import ball, table  # noqa: E402
+
+TABLES = {
+    "rectangle": {"small": [2, 1], "large": [200, 100]},
+    "elliptical": {"small": [2, 1], "large": [200, 100]},
+    "stadium": {"small": [2, 1], "large": [200, 100]},
+}
+ANGLE = 37.3  # Avoids periodic orbits in the rectangle
+
+def run(geometry, dims, reflections, phase):
+    billiards_table = table.Table(geometry, dims=dims)
+    billiards_table.reflections = reflections
+    billiards_ball = ball.Ball(billiards_table, pos=[dims[0]/10, dims[1]/10], angle=ANGLE)
+    start = time.perf_counter()
+    billiards_table.calc(billiards_ball, phase=phase)
+    return time.perf_counter() - start
+
+def peak_memory(geometry, dims, reflections):
+    tracemalloc.start()
+    run(geometry, dims, reflections, phase=True)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+def benchmark(max_exponent):
+    results = []
+    for geometry, sizes in TABLES.items():
+        for size, dims in sizes.items():
+            for exponent in range(2, max_exponent + 1):
+                reflections = 10**exponent
+                repeats = max(1, 10**(4 - exponent)) if exponent < 4 else 1  # Repeat short runs to beat timer noise
+                bare = min(run(geometry, dims, reflections, phase=False) for _ in range(repeats))
+                with_phase = min(run(geometry, dims, reflections, phase=True) for _ in range(repeats))
+                result = {
+                    "geometry": geometry, "size": size, "reflections": reflections,
+                    "collisions_per_sec": reflections/bare,
+                    "phase_space_us_per_point": 1e6*max(with_phase - bare, 0)/reflections if geometry != "rectangle" else 0.0,
+                    "peak_memory_bytes": peak_memory(geometry, dims, reflections),
+                }
+                results.append(result)
+                print(f"{geometry:10s} {size:5s} {reflections:>8d}  {result['collisions_per_sec']:>12,.0f} coll/s  "
+                      f"phase {result['phase_space_us_per_point']:6.2f} us/pt  peak {result['peak_memory_bytes']/2**20:8.2f} MiB")
+    return results
+
+def compare(results, baseline, tolerance):
+    # Returns the configurations whose throughput dropped by more than tolerance
+    reference = {(r["geometry"], r["size"], r["reflections"]): r for r in baseline["results"]}
+    regressions = []
+    for result in results:
+        old = reference.get((result["geometry"], result["size"], result["reflections"]))
+        if old is None:
+            continue
+        ratio = result["collisions_per_sec"]/old["collisions_per_sec"]
+        print(f"{result['geometry']:10s} {result['size']:5s} {result['reflections']:>8d}  {ratio:6.2f}x baseline throughput")
+        if ratio < 1 - tolerance:
+            regressions.append(result)
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--max-exponent", type=int, default=6, help="largest run is 10**max_exponent collisions")
+    parser.add_argument("--output", default="benchmark_results.json", help="where to write the results")
+    parser.add_argument("--baseline", help="results file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed fractional drop in collisions/sec")
+    args = parser.parse_args()
+    results = benchmark(args.max_exponent)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump({"python": platform.python_version(), "machine": platform.machine(), "results": results}, f, indent=1)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            sys.exit(f"{len(regressions)} configurations regressed by more than {args.tolerance:.0%}")
@@ -0,0 +1,52 @@
+"""Cold-start benchmark
+
+Times fresh interpreter processes that import the package and run a short compute-only
+simulation, and checks that matplotlib and scipy are never loaded by them.
+
+Usage: python benchmarks/startup.py [--runs N]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+COMPUTE_ONLY = """
+import sys
+from src import ball, table
+billiards_table = table.Table("stadium", dims=[2, 1])
+billiards_table.reflections = 1000
+billiards_table.calc(ball.Ball(billiards_table, pos=[0.1, 0.2], angle=37), phase=False)
+print(sorted(name for name in ("matplotlib", "scipy") if name in sys.modules))
+"""
+
+SCENARIOS = {
+    "interpreter": "print([])",
+    "compute_only": COMPUTE_ONLY,
+    "compute_with_plotting_imports": "import matplotlib.pyplot, scipy.special\n" + COMPUTE_ONLY,
+}
+
+def time_scenario(code, runs):
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        output = subprocess.run([sys.executable, "-c", code], cwd=ROOT, check=True, capture_output=True, text=True).stdout
+        times.append(time.perf_counter() - start)
+    return statistics.median(times), output.strip()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5, help="processes to start per scenario")
+    args = parser.parse_args()
+    results = {}
+    for name, code in SCENARIOS.items():
+        median, loaded = time_scenario(code, args.runs)
+        results[name] = {"median_seconds": median, "heavy_modules_loaded": loaded}
+        print(f"{name:32s} {1000*median:8.1f} ms   heavy modules loaded: {loaded}")
+    if results["compute_only"]["heavy_modules_loaded"] != "[]":
+        sys.exit("compute-only run imported matplotlib or scipy")
+    print(json.dumps(results))
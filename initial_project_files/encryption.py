@@ -18,6 +18,12 @@ import matplotlib.pyplot as plt
 from matplotlib import animation
 from time import sleep  # For menu options
 from sys import exit
+import functools
+import math
+import os
+import shutil
+import struct
+import tempfile
 
 ## For Encryption
 from hashlib import sha256
@@ -28,6 +34,32 @@ CENTRAL_WIDTH = 2+1e-15
 CENTRAL_HEIGHT = 1
 END_RADIUS = CENTRAL_HEIGHT/2
 
+## Key Derivation
+# Files written before the exact engine hold the angle on their first line and use bunimovich_geometry
+# (KDF_LEGACY); newer files start with KDF_MARKER and use stadium_key (KDF_EXACT).
+# Neither derivation is portable bit for bit: the stadium is chaotic, so a 1-ulp change in the
+# starting velocity gives an unrelated key after about 40 of the KEY_COLLISIONS collisions. Keys
+# therefore depend on the last bit of the platform's math.cos, math.sin and math.atan2 (which libm
+# need not round correctly), and a file may fail its key check when decrypted on another OS or
+# libm than the one that encrypted it. Decrypt on the platform that encrypted.
+KDF_LEGACY = 1
+KDF_EXACT = 2
+KDF_MARKER = "billiards-kdf-2"
+KEY_COLLISIONS = 1000
+# On-disk cache of stadium_key values, one small file per key; set BILLIARDS_KEY_CACHE to another
+# directory, or to nothing to disable it. Only the KEY_CACHE_SIZE most recently used keys are kept.
+KEY_CACHE_DIR = os.environ.get("BILLIARDS_KEY_CACHE", os.path.join(os.path.expanduser("~"), ".cache", "billiards", "stadium_keys"))
+KEY_CACHE_SIZE = 256
+
+## Binary Container
+# Streamed files: magic, version, key derivation, angle (radians), AES IV, key check value, then the
+# raw AES-CFB ciphertext. The key check (start of the key's own sha256) catches wrong keys without
+# needing the plaintext to be text.
+CONTAINER_MAGIC = b"BILLCRYP"
+CONTAINER_VERSION = 1
+CONTAINER_HEADER = struct.Struct("<8sBBd16s4s")
+CHUNK_SIZE = 64*1024
+
 def bunimovich_geometry(angle):
     """Main Bunimovich Billiards Function
     
@@ -127,6 +159,147 @@ def bunimovich_geometry(angle):
     key = arc_length[-1]/(box_perimeter + 2*semicircle_perimeter)  # Normalised arc length
     return key  
 
+@functools.lru_cache(maxsize=1024)
+def stadium_key(angle, width=CENTRAL_WIDTH, height=CENTRAL_HEIGHT, collisions=KEY_COLLISIONS, kdf=KDF_EXACT):
+    """Fast Key Function
+    
+        - Same construction as bunimovich_geometry, but with exact collisions (_kdf_exact_arc), so
+          a key takes milliseconds rather than seconds
+        - Keys are remembered in memory and in the on-disk cache at KEY_CACHE_DIR, so repeated
+          decrypts with the same angle and stadium are near-instant
+        
+    Parameters
+    ----------
+        angle: float
+            angle in radians at which billiard ball is hit
+        width: float
+            central width of the stadium
+        height: float
+            central height of the stadium
+        collisions: int
+            number of collisions simulated
+        kdf: int
+            key derivation version; only KDF_EXACT is computed here
+    Returns
+    -------
+        key: float
+            last boundary arc length as a fraction of the perimeter, used as key in encryption
+    """
+    if kdf != KDF_EXACT:
+        raise ValueError(f"stadium_key has no key derivation {kdf}")
+    cache_key = f"{int(kdf)}|{float(angle)!r}|{float(width)!r}|{float(height)!r}|{int(collisions)}"
+    key = _read_cached_key(cache_key)
+    if key is None:
+        key = _kdf_exact_arc(float(angle), float(width), float(height), int(collisions))
+        _write_cached_key(cache_key, key)
+    return key
+
+def _kdf_exact_arc(angle, width, height, collisions):
+    # Frozen copy of the exact stadium run as it stood when KDF_EXACT was introduced. Keys of
+    # existing files depend on every rounding step here, so this must never change; a new
+    # derivation gets a new KDF id and its own function instead
+    half_width, end_radius = width/2, height/2
+    perimeter = 4*half_width + 2*np.pi*end_radius
+    x, y = 0.0, 0.0
+    vel_x, vel_y = math.cos(angle), math.sin(angle)
+    for i in range(collisions):
+        # Flat top or bottom, whichever the ball is heading towards
+        t = np.inf
+        in_circle = False
+        if vel_y:
+            t_flat = ((end_radius if vel_y > 0 else -end_radius) - y)/vel_y
+            if t_flat > 0 and abs(x + vel_x*t_flat) <= half_width:
+                t = t_flat
+        # End semicircles: the far root of |pos + vel*t - centre| = end_radius
+        for centre in (half_width, -half_width):
+            rel_x = x - centre
+            half_b = rel_x*vel_x + y*vel_y
+            disc = half_b**2 - (rel_x**2 + y**2 - end_radius**2)
+            if disc < 0:
+                continue
+            t_end = math.sqrt(disc) - half_b
+            if 1e-12 < t_end < t and (x + vel_x*t_end - centre)*centre >= 0:
+                t = t_end
+                in_circle = True
+                end_centre = centre
+        x += vel_x*t
+        if in_circle:
+            y += vel_y*t
+            dist = math.hypot(x - end_centre, y)
+            norm_x, norm_y = (x - end_centre)/dist, y/dist
+            x, y = end_centre + end_radius*norm_x, end_radius*norm_y
+            vel_norm = vel_x*norm_x + vel_y*norm_y
+            vel_x -= 2*vel_norm*norm_x
+            vel_y -= 2*vel_norm*norm_y
+        else:
+            y = end_radius if vel_y > 0 else -end_radius
+            vel_y = -vel_y
+    # Arc length of the last collision, anticlockwise from the right-most point of the boundary
+    if in_circle:
+        angle = math.atan2(y, x - end_centre)
+        if end_centre > 0:
+            s = end_radius*angle + (perimeter if angle < 0 else 0)
+        else:
+            s = 2*half_width + end_radius*(angle % (2*np.pi))
+    elif y > 0:
+        s = np.pi*end_radius/2 + half_width - x
+    else:
+        s = 3*np.pi*end_radius/2 + 3*half_width + x
+    return float(s)/(2*width + np.pi*height)  # Normalised arc length
+
+def _cache_file(cache_key):
+    return os.path.join(KEY_CACHE_DIR, sha256(cache_key.encode('utf-8')).hexdigest()[:32])
+
+def _read_cached_key(cache_key):
+    if not KEY_CACHE_DIR:
+        return None
+    path = _cache_file(cache_key)
+    try:
+        with open(path, encoding="utf-8") as f:
+            stored_key, value = f.read().split("\n")[:2]
+        if stored_key != cache_key:
+            return None
+        os.utime(path)  # Mark as recently used
+        return float(value)
+    except (OSError, ValueError):  # Missing or unreadable entry: derive the key afresh
+        return None
+
+def _write_cached_key(cache_key, key):
+    if not KEY_CACHE_DIR:
+        return
+    try:
+        os.makedirs(KEY_CACHE_DIR, exist_ok=True)
+        # Write then rename, so a reader never sees a half-written entry
+        fd, temp_path = tempfile.mkstemp(dir=KEY_CACHE_DIR, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(f"{cache_key}\n{key!r}\n")
+        os.replace(temp_path, _cache_file(cache_key))
+        entries = [entry for entry in os.scandir(KEY_CACHE_DIR) if not entry.name.endswith(".tmp")]
+        if len(entries) > KEY_CACHE_SIZE:  # Drop the least recently used keys
+            entries.sort(key=lambda entry: entry.stat().st_mtime)
+            for entry in entries[:len(entries) - KEY_CACHE_SIZE]:
+                os.remove(entry.path)
+    except OSError:
+        pass  # The cache only saves time, so failing to write it is not an error
+
+def derive_key(angle, kdf=KDF_EXACT):
+    """AES key (sha256 digest) for an angle, by the key derivation the file was written with."""
+    if kdf not in (KDF_LEGACY, KDF_EXACT):
+        raise ValueError(f"Unknown key derivation {kdf}")
+    unhashed_key = str(float(stadium_key(angle, kdf=kdf))) if kdf == KDF_EXACT else str(bunimovich_geometry(angle))
+    return sha256(unhashed_key.encode('utf-8')).digest()
+
+def ask_angle():
+    """Asks for the angle to hit the ball at, in degrees, and returns it in radians."""
+    angle = input("What angle (in degrees) do you wanna hit your ball at?\n")
+    try:  # Test if user input is valid
+        angle = float(angle)
+    except ValueError:
+        print("NO! Enter a valid angle!!!!!! 5 second sinbin.")
+        sleep(5)
+        main()
+    return np.radians(angle)
+
 def encrypt(path, plaintext):
     """Encryption Function
     
@@ -142,39 +315,102 @@ def encrypt(path, plaintext):
         plaintext: str 
             string to be encrypted.
     """
-    angle = input("What angle (in degrees) do you wanna hit your ball at?\n")
-    try:  # Test if user input is valid
-        angle = float(angle)
-    except ValueError:
-        print("NO! Enter a valid angle!!!!!! 5 second sinbin.")
-        sleep(5)
-        main()
+    angle = ask_angle()
     print("Encrypting...")
-    angle = np.radians(angle)
-    unhashed_key = str(bunimovich_geometry(angle))
-    key = sha256(unhashed_key.encode('utf-8')).digest()
+    key = derive_key(angle)
     aes = AES.new(key, AES.MODE_CFB)
     ciphertext = aes.encrypt(plaintext.encode('utf8'))
     with open(path, "w", encoding="utf-8") as f:
+        f.write(KDF_MARKER+'\n')
         f.write(str(angle)+'\n')
         f.write(str(aes.iv.hex())+'\n')  # Write in hex form to make it nicer to look at
         f.write(str(ciphertext.hex())+'\n')
     
+def stream_encrypt(path, angle, chunk_size=CHUNK_SIZE):
+    """Streaming Encryption Function
+    
+        - Encrypts the file at path in place, chunk_size bytes at a time, so memory use does not
+          grow with the file
+        - Writes a binary container (CONTAINER_HEADER then raw ciphertext) to a temporary file
+          beside the original and then replaces the original with it
+    
+    Parameters
+    ----------
+        path: str 
+            file to encrypt; any contents, not just text.
+        angle: float
+            angle in radians at which billiard ball is hit
+        chunk_size: int
+            bytes read and encrypted at a time
+    """
+    key = derive_key(angle)
+    aes = AES.new(key, AES.MODE_CFB, segment_size=128)
+    header = CONTAINER_HEADER.pack(CONTAINER_MAGIC, CONTAINER_VERSION, KDF_EXACT, angle, aes.iv, sha256(key).digest()[:4])
+    _rewrite(path, header, 0, aes.encrypt, chunk_size)
+
+def stream_decrypt(path, chunk_size=CHUNK_SIZE):
+    """Streaming Decryption Function
+    
+        - Decrypts a file written by stream_encrypt in place, chunk_size bytes at a time
+        - Raises ValueError, leaving the file untouched, if it is not a container or the key is wrong
+    
+    Parameters
+    ----------
+        path: str 
+            encrypted file.
+        chunk_size: int
+            bytes read and decrypted at a time
+    """
+    with open(path, "rb") as f:
+        header = f.read(CONTAINER_HEADER.size)
+    if len(header) < CONTAINER_HEADER.size or not header.startswith(CONTAINER_MAGIC):
+        raise ValueError(f"{path} is not an encrypted billiards container")
+    magic, version, kdf, angle, iv, check = CONTAINER_HEADER.unpack(header)
+    if version != CONTAINER_VERSION:
+        raise ValueError(f"{path} is a version {version} container; only version {CONTAINER_VERSION} is supported")
+    if kdf not in (KDF_LEGACY, KDF_EXACT):
+        raise ValueError(f"{path} uses unknown key derivation {kdf}")
+    key = derive_key(angle, kdf)
+    if sha256(key).digest()[:4] != check:
+        raise ValueError(f"Wrong key for {path}")
+    aes = AES.new(key, AES.MODE_CFB, iv=iv, segment_size=128)
+    _rewrite(path, b"", CONTAINER_HEADER.size, aes.decrypt, chunk_size)
+
+def _rewrite(path, header, offset, transform, chunk_size):
+    # Streams header + transform(contents of path after offset) into a temporary file in the same
+    # directory, then atomically swaps it in; the original is untouched if anything fails
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix=".tmp")
+    try:
+        with open(path, "rb") as source, os.fdopen(fd, "wb") as target:
+            source.seek(offset)
+            target.write(header)
+            while True:
+                chunk = source.read(chunk_size)
+                if not chunk:
+                    break
+                target.write(transform(chunk))
+            target.flush()
+            os.fsync(target.fileno())
+        shutil.copymode(path, temp_path)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
 def file_encrypt():
     """File Encryption Function
     
-        - Ingests a file at a specified path
-        - Overwrites file with encrypted contents
+        - Encrypts a file at a specified path in place, streaming it through stream_encrypt
     """
     file_path = input("Where's the file?\n")
-    try:
-        with open(file_path, 'r', encoding="utf-8") as f:
-            plaintext = f.read()
-    except FileNotFoundError:
+    if not os.path.isfile(file_path):
         print('File not found!!!!!')
         sleep(2)
         main()
-    encrypt(file_path, plaintext)
+    angle = ask_angle()
+    print("Encrypting...")
+    stream_encrypt(file_path, angle)
     print("Done!")
     sleep(1)
     main()
@@ -188,21 +424,36 @@ def decrypt():
         - Hashed key and iv used to decrypt the file (using AES)
         - Contents of file replaced with decrypted contents
         - If decryption fails, file's encrypted contents fully restored and error message thrown up
+        - Binary containers from stream_encrypt are decrypted in chunks by stream_decrypt
     """
     file_path = input("Where's the encrypted file bud?\n")
     try:
-        with open(file_path, 'r', encoding="utf-8") as f:
-            lines = f.readlines()
+        with open(file_path, 'rb') as f:
+            streamed = f.read(len(CONTAINER_MAGIC)) == CONTAINER_MAGIC
+        if not streamed:
+            with open(file_path, 'r', encoding="utf-8") as f:
+                lines = f.readlines()
     except FileNotFoundError:
         print("File not found!!!!")
         sleep(2)
         main()
     print("Decrypting...")
-    angle = float(lines[0])
-    iv = bytes.fromhex(lines[1])  # Initialisation vector for AES
-    ciphertext = bytes.fromhex(lines[2])
-    unhashed_key = str(bunimovich_geometry(angle))
-    key = sha256(unhashed_key.encode('utf-8')).digest()
+    if streamed:  # Binary container from stream_encrypt
+        try:
+            stream_decrypt(file_path)
+            print('Done!')
+            sleep(1)
+        except ValueError:
+            print("INTRUDER!!!!! INTRUDER!!!!")
+            sleep(3)
+        main()
+        return
+    kdf = KDF_EXACT if lines[0].strip() == KDF_MARKER else KDF_LEGACY
+    fields = lines[1:] if kdf == KDF_EXACT else lines
+    angle = float(fields[0])
+    iv = bytes.fromhex(fields[1])  # Initialisation vector for AES
+    ciphertext = bytes.fromhex(fields[2])
+    key = derive_key(angle, kdf)
     aes = AES.new(key, AES.MODE_CFB, iv=iv)
     plaintext = aes.decrypt(ciphertext)
     with open(file_path, "w", encoding="utf-8") as f:
@@ -277,4 +528,6 @@ def main():
         ax.set_xlabel("Value of unhashed key, $s$")
         ax.set_ylabel("Frequency")
         ax.set_title("Histogram of 1000 Random Unhashed Keys")
-main()
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,12 @@
+import argparse
 import sys
-from src import table, ball, utils
+import numpy as np
+from src import batch, geometry as geometries, hcf, table, ball, utils
 
 def main():
-    allowed_geometries = ["rectangle", "elliptical", "stadium"]
+    allowed_geometries = ["rectangle", "elliptical", "stadium"] + list(geometries.GEOMETRIES)
     while True:
-        geometry = input("Table Geometry (rectangle, elliptical or stadium): ")
+        geometry = input(f"Table Geometry ({', '.join(allowed_geometries[:-1])} or {allowed_geometries[-1]}): ")
         if geometry.lower() in allowed_geometries:
             break
         elif geometry.lower() == "q":
@@ -16,8 +18,31 @@ def main():
         billiards_table.rectangle_calc(billiards_ball)
     elif geometry == "elliptical":
         billiards_table.elliptical_calc(billiards_ball)
-    else:
+    elif geometry == "stadium":
         billiards_table.stadium_calc(billiards_ball)
+    else:
+        billiards_table.calc(billiards_ball)
     billiards_table.plot(billiards_ball)
 
-main()
\ No newline at end of file
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simulate mathematical billiards. Runs interactively unless a job file is given.")
+    parser.add_argument("--jobs", help="JSON or CSV file of runs to execute back-to-back without prompts")
+    parser.add_argument("--output", default="runs", help="directory for the trajectory files written by --jobs")
+    parser.add_argument("--hcf", help="file of integer pairs m, n; prints the highest common factor of each found by rectangle billiards")
+    parser.add_argument("--verify", action="store_true", help="with --hcf, check every result against math.gcd")
+    args = parser.parse_args()
+    if args.hcf:
+        pairs = hcf.load_pairs(args.hcf)
+        factor, bounces, corner = hcf.hcf(pairs[:, 0], pairs[:, 1])
+        print("m,n,hcf,bounces,corner")
+        np.savetxt(sys.stdout, np.column_stack([pairs, factor, bounces, corner]), fmt="%d", delimiter=",")
+        if args.verify:
+            wrong = hcf.verify(pairs[:, 0], pairs[:, 1], factor)
+            if len(wrong):
+                sys.exit(f"{len(wrong)} pairs disagree with math.gcd, first at line {wrong[0] + 1}")
+            print(f"All {len(pairs)} pairs agree with math.gcd", file=sys.stderr)
+    elif args.jobs:
+        for path in batch.run_jobs(batch.load_jobs(args.jobs), args.output):
+            print(path)
+    else:
+        main()
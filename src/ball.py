@@ -2,22 +2,30 @@ from src import utils
 import numpy as np
 
 class Ball:
-    def __init__(self, table):
-        while True:
-            x = utils.input_test("Enter starting x position: ", integer=False)
-            y = utils.input_test("Enter starting y position: ", integer=False)
-            if table.geometry == "rectangle":
-                if abs(x) <= table.dims[0]/2 and abs(y) <= table.dims[1]/2:
+    def __init__(self, table, pos=None, angle=None):
+        if pos is not None:
+            x, y = pos
+            if not on_table(table, x, y):
+                raise ValueError(f"Starting position ({x}, {y}) is not on the table")
+        else:
+            while True:
+                x = utils.input_test("Enter starting x position: ", integer=False)
+                y = utils.input_test("Enter starting y position: ", integer=False)
+                if on_table(table, x, y):
                     break
-            elif table.geometry == "elliptical":
-                if (x/table.dims[0])**2 + (y/table.dims[1])**2 <= 1:
-                    break
-            else:
-                if abs(x) <= table.dims[0]/2 and abs(y) <= table.dims[1]/2:
-                    if not ((x > table.dims[0]/2 and x-table.dims[0]/2 > np.sqrt((table.dims[1]/2)**2-y**2)) or (x < table.dims[0]/2 and x+table.dims[0]/2 < -np.sqrt((table.dims[1]/2)**2-y**2))):
-                        break
-            print('Error: not on the table')
+                print('Error: not on the table')
         self.init_pos = np.array([x, y])  # Needed for plotting
         self.pos = self.init_pos
-        self.angle = utils.input_test("Enter starting angle in degrees: ", integer=False)
-        self.vel = [np.cos(np.radians(self.angle)), np.sin(np.radians(self.angle))]
\ No newline at end of file
+        self.angle = utils.input_test("Enter starting angle in degrees: ", integer=False) if angle is None else angle
+        self.vel = [np.cos(np.radians(self.angle)), np.sin(np.radians(self.angle))]
+
+def on_table(table, x, y):
+    if table.shape is not None:
+        return table.shape.contains(x, y)
+    elif table.geometry == "rectangle":
+        return abs(x) <= table.dims[0]/2 and abs(y) <= table.dims[1]/2
+    elif table.geometry == "elliptical":
+        return (x/table.dims[0])**2 + (y/table.dims[1])**2 <= 1
+    else:
+        end_x = max(abs(x) - table.dims[0]/2, 0)  # Distance beyond the centre of the nearest end
+        return end_x**2 + y**2 <= (table.dims[1]/2)**2
\ No newline at end of file
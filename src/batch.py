@@ -0,0 +1,44 @@
+import csv
+import json
+import os
+from src import ball, table
+
+JOB_FIELDS = ["geometry", "dims", "pos", "angle", "reflections"]
+
+def load_jobs(path):
+    """Read a job file of billiards runs.
+
+    JSON files hold a list of objects with keys geometry, dims, pos, angle and
+    reflections. CSV files have a header row with columns geometry, width, height,
+    x, y, angle and reflections (width/height are the semi-axes for ellipses).
+    """
+    if path.lower().endswith(".csv"):
+        with open(path, newline="", encoding="utf-8") as f:
+            return [{"geometry": row["geometry"].strip().lower(),
+                     "dims": [float(row["width"]), float(row["height"])],
+                     "pos": [float(row["x"]), float(row["y"])],
+                     "angle": float(row["angle"]),
+                     "reflections": int(row["reflections"])} for row in csv.DictReader(f)]
+    with open(path, encoding="utf-8") as f:
+        jobs = json.load(f)
+    for number, job in enumerate(jobs):
+        missing = [field for field in JOB_FIELDS if field not in job]
+        if missing:
+            raise ValueError(f"Job {number} is missing {', '.join(missing)}")
+    return jobs
+
+def run_jobs(jobs, output_dir, phase=True):
+    """Run jobs back-to-back in this process, recording each to output_dir/job_<n>.bil.
+
+    Returns the list of files written, in job order.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    paths = []
+    for number, job in enumerate(jobs):
+        billiards_table = table.Table(job["geometry"], dims=job["dims"])
+        billiards_table.reflections = int(job["reflections"])
+        billiards_ball = ball.Ball(billiards_table, pos=job["pos"], angle=job["angle"])
+        path = os.path.join(output_dir, f"job_{number:05d}.bil")
+        billiards_table.record(billiards_ball, path, phase=phase)
+        paths.append(path)
+    return paths
@@ -0,0 +1,102 @@
+import numpy as np
+from src import ball, utils
+
+class Ensemble:
+    """Many billiard balls on the same table, advanced together by Table.ensemble_calc.
+
+    positions is an (N, 2) array of starting positions and angles an (N,) array of
+    starting angles in degrees.
+    """
+    def __init__(self, table, positions, angles):
+        positions = np.array(positions, dtype=float).reshape(-1, 2)
+        angles = np.broadcast_to(np.asarray(angles, dtype=float), positions.shape[:1])
+        x, y = positions.T
+        if table.shape is not None:  # Registered shapes test one point at a time
+            on_table = np.array([ball.on_table(table, px, py) for px, py in positions], dtype=bool)
+        elif table.geometry == "rectangle":
+            on_table = (np.abs(x) <= table.dims[0]/2) & (np.abs(y) <= table.dims[1]/2)
+        elif table.geometry == "elliptical":
+            on_table = (x/table.dims[0])**2 + (y/table.dims[1])**2 <= 1
+        else:
+            end_x = np.maximum(np.abs(x) - table.dims[0]/2, 0)
+            on_table = end_x**2 + y**2 <= (table.dims[1]/2)**2
+        if not np.all(on_table):
+            raise ValueError(f"{np.count_nonzero(~on_table)} starting positions are not on the table")
+        self.init_pos = positions
+        self.pos = positions.copy()
+        self.angle = angles.copy()
+        self.vel = np.column_stack([np.cos(np.radians(angles)), np.sin(np.radians(angles))])
+
+def rectangle_step(dims, x, y, vel_x, vel_y):
+    half_width, half_height = dims[0]/2, dims[1]/2
+    # Rounding residue of launches along an axis, as in Table.rectangle_calc
+    vel_x, vel_y = np.where(np.abs(vel_x) < 1e-15, 0.0, vel_x), np.where(np.abs(vel_y) < 1e-15, 0.0, vel_y)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t_x = np.where(vel_x != 0, (np.copysign(half_width, vel_x) - x)/vel_x, np.inf)
+        t_y = np.where(vel_y != 0, (np.copysign(half_height, vel_y) - y)/vel_y, np.inf)
+    t_x, t_y = np.maximum(t_x, 0), np.maximum(t_y, 0)
+    side = t_x <= t_y  # Sides win ties, as in Table.rectangle_calc
+    t = np.where(side, t_x, t_y)
+    new_x = np.where(side, np.copysign(half_width, vel_x), x + vel_x*t)
+    new_y = np.where(side, y + vel_y*t, np.copysign(half_height, vel_y))
+    return new_x, new_y, np.where(side, -vel_x, vel_x), np.where(side, vel_y, -vel_y)
+
+def elliptical_step(dims, x, y, vel_x, vel_y):
+    a, b = dims
+    quad_a = (vel_x/a)**2 + (vel_y/b)**2
+    quad_b = 2*(x*vel_x/a**2 + y*vel_y/b**2)
+    quad_c = (x/a)**2 + (y/b)**2 - 1
+    root = np.sqrt(np.maximum(quad_b**2 - 4*quad_a*quad_c, 0))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t = np.where(quad_b <= 0, (root - quad_b)/(2*quad_a), -2*quad_c/(quad_b + root))
+    x, y = x + vel_x*t, y + vel_y*t
+    norm_x, norm_y = x/a**2, y/b**2
+    norm = np.hypot(norm_x, norm_y)
+    norm_x, norm_y = norm_x/norm, norm_y/norm
+    vel_norm = vel_x*norm_x + vel_y*norm_y
+    return x, y, vel_x - 2*vel_norm*norm_x, vel_y - 2*vel_norm*norm_y
+
+def stadium_step(dims, x, y, vel_x, vel_y):
+    half_width, end_radius = dims[0]/2, dims[1]/2
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t = np.where(vel_y != 0, (np.copysign(end_radius, vel_y) - y)/vel_y, np.inf)
+    t = np.where((t > 0) & (np.abs(x + vel_x*t) <= half_width), t, np.inf)
+    end_centre = np.zeros_like(x)
+    for centre in (half_width, -half_width):
+        rel_x = x - centre
+        half_b = rel_x*vel_x + y*vel_y
+        disc = half_b**2 - (rel_x**2 + y**2 - end_radius**2)
+        t_end = np.sqrt(np.maximum(disc, 0)) - half_b
+        hit = (disc >= 0) & (t_end > 1e-12) & (t_end < t) & ((x + vel_x*t_end - centre)*centre >= 0)
+        t = np.where(hit, t_end, t)
+        end_centre = np.where(hit, centre, end_centre)
+    in_circle = end_centre != 0
+    x, y = x + vel_x*t, y + vel_y*t
+    rel_x = x - end_centre
+    dist = np.where(in_circle, np.hypot(rel_x, y), 1)
+    norm_x = np.where(in_circle, rel_x/dist, 0)
+    norm_y = np.where(in_circle, y/dist, np.sign(y))
+    x = np.where(in_circle, end_centre + end_radius*norm_x, x)
+    y = np.where(in_circle, end_radius*norm_y, np.copysign(end_radius, y))
+    vel_norm = vel_x*norm_x + vel_y*norm_y
+    return x, y, vel_x - 2*vel_norm*norm_x, vel_y - 2*vel_norm*norm_y
+
+def elliptical_phase(dims, x, y, vel_x, vel_y):
+    a, b = dims
+    s = utils.ellipse_arc_length(np.arctan2(a*y, b*x) % np.pi, a, b)
+    tang_x, tang_y = -y/b**2, x/a**2
+    return s, (vel_x*tang_x + vel_y*tang_y)/np.hypot(tang_x, tang_y)/np.hypot(vel_x, vel_y)
+
+def stadium_phase(dims, x, y, vel_x, vel_y):
+    half_width, end_radius = dims[0]/2, dims[1]/2
+    perimeter = 4*half_width + 2*np.pi*end_radius
+    end_centre = np.where(np.abs(x) > half_width, np.copysign(half_width, x), 0)
+    angle = np.arctan2(y, x - end_centre)
+    s = np.where(y > 0, np.pi*end_radius/2 + half_width - x, 3*np.pi*end_radius/2 + 3*half_width + x)  # Top and bottom
+    s = np.where(end_centre > 0, end_radius*angle + np.where(angle < 0, perimeter, 0), s)
+    s = np.where(end_centre < 0, 2*half_width + end_radius*np.mod(angle, 2*np.pi), s)
+    cos = np.where(end_centre != 0, (-vel_x*np.sin(angle) + vel_y*np.cos(angle)), vel_x)
+    return s, cos
+
+STEPS = {"rectangle": rectangle_step, "elliptical": elliptical_step, "stadium": stadium_step}
+PHASES = {"elliptical": elliptical_phase, "stadium": stadium_phase}
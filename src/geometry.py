@@ -0,0 +1,519 @@
+import math
+import numpy as np
+from src import utils
+
+GEOMETRIES = {}  # Table shapes handled by the generic engine, by name
+
+def register(name):
+    """Class decorator adding a Geometry subclass to GEOMETRIES, so Table(name, dims) can use it."""
+    def decorator(cls):
+        GEOMETRIES[name] = cls
+        return cls
+    return decorator
+
+class Geometry:
+    """Base class for table shapes simulated by the generic engine (Table._plugin_run).
+
+    Subclasses implement next_collision and contains; arc lengths, plotting outlines and
+    the phase-space range default to a polyline approximation of the boundary.
+    """
+    dim_names = []  # Prompts used when the table is set up interactively
+
+    def __init__(self, dims):
+        self.dims = np.asarray(dims, dtype=float)
+        if self.dims.shape != (len(self.dim_names),):
+            raise ValueError(f"{type(self).__name__} needs dims {self.dim_names}, got {dims}")
+        self._outline = None
+
+    @classmethod
+    def prompt(cls):
+        """Ask for the dims interactively, one per entry of dim_names."""
+        return [utils.input_test(f"Table {name}: ", integer=False, positive=True) for name in cls.dim_names]
+
+    def contains(self, x, y):
+        raise NotImplementedError
+
+    def next_collision(self, x, y, vel_x, vel_y):
+        """Returns (t, norm_x, norm_y, wall) for the first boundary hit along pos + vel*t, t > 0."""
+        raise NotImplementedError
+
+    def outline(self):
+        """Boundary as a closed polyline (xs, ys), anticlockwise from the positive x-axis."""
+        raise NotImplementedError
+
+    def arc_length(self, x, y, wall):
+        # Arc length anticlockwise from the positive x-axis, interpolated along the outline by polar angle
+        xs, ys, lengths = self._boundary()
+        angles = np.unwrap(np.arctan2(ys, xs))
+        return np.interp(np.mod(np.arctan2(y, x), 2*np.pi), angles - angles[0], lengths)
+
+    def s_max(self):
+        return float(self._boundary()[2][-1])
+
+    def _boundary(self):
+        # Outline and cumulative length along it, computed once per table
+        if self._outline is None:
+            xs, ys = self.outline()
+            self._outline = xs, ys, np.concatenate([[0], np.cumsum(np.hypot(np.diff(xs), np.diff(ys)))])
+        return self._outline
+
+class ImplicitGeometry(Geometry):
+    """Convex table whose boundary is f(x, y) = 0, with f a convex function that is negative inside.
+
+    The first crossing along a ray is bracketed by coarse steps over the table's diameter and
+    then refined by Newton's method from the outside, safeguarded by bisection of the bracket
+    where Newton converges slowly (very flat or very steep boundaries), so no dense sampling
+    is needed.
+    """
+    coarse_steps = 8
+    tolerance = 1e-14
+    max_iterations = 200
+
+    def f(self, x, y):
+        raise NotImplementedError
+
+    def grad(self, x, y):
+        raise NotImplementedError
+
+    def diameter(self):
+        """Upper bound on the length of any chord of the table."""
+        raise NotImplementedError
+
+    def contains(self, x, y):
+        return self.f(x, y) <= 0
+
+    def next_collision(self, x, y, vel_x, vel_y):
+        diameter = self.diameter()
+        step = diameter/self.coarse_steps
+        t = step
+        while t < diameter and self.f(x + vel_x*t, y + vel_y*t) <= 0:
+            t += step
+        t = min(t, diameter)
+        # The crossing lies in [low, high], with f <= 0 at low and f > 0 at high. Newton steps are
+        # taken from the outside while they stay in the bracket and at least halve the last step;
+        # otherwise the bracket is bisected, so steep boundaries (large p) still converge
+        low, high = max(t - step, 0.0), t
+        last_step = high - low
+        for _ in range(self.max_iterations):
+            value = self.f(x + vel_x*t, y + vel_y*t)
+            if value > 0:
+                high = t
+            else:
+                low = t
+            grad_x, grad_y = self.grad(x + vel_x*t, y + vel_y*t)
+            slope = grad_x*vel_x + grad_y*vel_y
+            if slope > 0 and low <= t - value/slope <= high and abs(2*value) <= abs(last_step*slope):
+                dt = value/slope
+            else:
+                dt = t - (low + high)/2
+            t -= dt
+            last_step = dt
+            if abs(dt) <= self.tolerance*diameter:
+                break
+        else:
+            raise RuntimeError(f"No boundary crossing found from ({x}, {y}) after {self.max_iterations} iterations")
+        if high == diameter and self.f(x + vel_x*high, y + vel_y*high) <= 0:
+            raise RuntimeError(f"Ray from ({x}, {y}) does not leave the table within its diameter")
+        grad_x, grad_y = self.grad(x + vel_x*t, y + vel_y*t)
+        norm = math.hypot(grad_x, grad_y)
+        return t, grad_x/norm, grad_y/norm, 0
+
+    def outline(self, points=2049):
+        # Cast rays from the centre and solve f = 0 along each with the same Newton iteration
+        angles = np.linspace(0, 2*np.pi, points)
+        radius = np.array([self.next_collision(0.0, 0.0, math.cos(angle), math.sin(angle))[0] for angle in angles])
+        return radius*np.cos(angles), radius*np.sin(angles)
+
+@register("superellipse")
+class Superellipse(ImplicitGeometry):
+    """|x/a|^p + |y/b|^p = 1: an ellipse for p = 2, tending to a rectangle as p grows."""
+    dim_names = ["semi-axis a", "semi-axis b", "exponent p (at least 2)"]
+
+    def __init__(self, dims):
+        super().__init__(dims)
+        if np.any(self.dims[:2] <= 0) or self.dims[2] < 2:
+            raise ValueError("Superellipse needs positive semi-axes and an exponent of at least 2")
+        self.a, self.b, self.p = (float(d) for d in self.dims)
+
+    def f(self, x, y):
+        return abs(x/self.a)**self.p + abs(y/self.b)**self.p - 1
+
+    def grad(self, x, y):
+        return (self.p/self.a*abs(x/self.a)**(self.p - 1)*math.copysign(1, x),
+                self.p/self.b*abs(y/self.b)**(self.p - 1)*math.copysign(1, y))
+
+    def diameter(self):
+        return 2*math.hypot(self.a, self.b)
+
+class EdgeTree:
+    """Bounding-volume hierarchy over a closed chain of edges.
+
+    Consecutive edges of a boundary lie close together, so the tree is built by halving the
+    chain rather than sorting: leaves hold `leaf_size` consecutive edges and each level above
+    boxes pairs of nodes from the level below. Building is O(N) and the boxes stay tight.
+    Polygon.next_collision walks the levels directly, nearest box first.
+    """
+    leaf_size = 4
+
+    def __init__(self, starts, ends):
+        lo, hi = np.minimum(starts, ends), np.maximum(starts, ends)
+        self.count = len(starts)
+        boundaries = np.arange(0, self.count, self.leaf_size)
+        lo, hi = np.minimum.reduceat(lo, boundaries), np.maximum.reduceat(hi, boundaries)
+        levels = [(lo, hi)]
+        while len(lo) > 1:
+            pairs = np.arange(0, len(lo), 2)
+            lo, hi = np.minimum.reduceat(lo, pairs), np.maximum.reduceat(hi, pairs)
+            levels.append((lo, hi))
+        # Root first; each level as plain lists [lo_x, lo_y, hi_x, hi_y] for fast scalar access
+        self.levels = [[lo[:, 0].tolist(), lo[:, 1].tolist(), hi[:, 0].tolist(), hi[:, 1].tolist()] for lo, hi in reversed(levels)]
+
+def regular_polygon(sides, radius=1.0):
+    """Vertices of a regular polygon inscribed in a circle of the given radius, for Polygon dims."""
+    angles = 2*np.pi*np.arange(sides)/sides
+    return np.column_stack([radius*np.cos(angles), radius*np.sin(angles)])
+
+@register("polygon")
+class Polygon(Geometry):
+    """Simple (possibly non-convex) polygon with dims an (N, 2) array of vertices.
+
+    Edges are indexed by a bounding-volume hierarchy (see EdgeTree), so each bounce tests
+    O(log N) boxes and a few edges however many the polygon has. Wall i is the edge from
+    vertex i to vertex i+1 and s is measured anticlockwise from the first vertex.
+    """
+    def __init__(self, dims):
+        vertices = np.asarray(dims, dtype=float)
+        if vertices.ndim != 2 or vertices.shape[1] != 2 or len(vertices) < 3:
+            raise ValueError(f"Polygon needs an (N, 2) array of at least 3 vertices, got {dims}")
+        following = np.roll(vertices, -1, axis=0)
+        signed_area = np.sum(vertices[:, 0]*following[:, 1] - following[:, 0]*vertices[:, 1])/2
+        if signed_area == 0:
+            raise ValueError("Polygon vertices must enclose a non-zero area")
+        if signed_area < 0:  # Store vertices anticlockwise so edge normals point outwards
+            vertices = np.concatenate([vertices[:1], vertices[:0:-1]])
+            following = np.roll(vertices, -1, axis=0)
+        self.dims = vertices
+        self._outline = None
+        edges = following - vertices
+        lengths = np.hypot(edges[:, 0], edges[:, 1])
+        if np.any(lengths == 0):
+            raise ValueError("Polygon has repeated consecutive vertices")
+        self.cumulative = np.concatenate([[0], np.cumsum(lengths)])
+        # Plain lists of floats keep the per-bounce search in fast Python arithmetic
+        self.px, self.py = vertices[:, 0].tolist(), vertices[:, 1].tolist()
+        self.ex, self.ey = edges[:, 0].tolist(), edges[:, 1].tolist()
+        self.norm_x, self.norm_y = (edges[:, 1]/lengths).tolist(), (-edges[:, 0]/lengths).tolist()
+        self.tree = EdgeTree(vertices, following)
+        self.eps = 1e-12*float(np.hypot(*np.ptp(vertices, axis=0)))
+
+    @classmethod
+    def prompt(cls):
+        sides = utils.input_test("Number of vertices (at least 3): ", positive=True)
+        return [[utils.input_test(f"Vertex {i + 1} {axis}: ", integer=False) for axis in "xy"] for i in range(sides)]
+
+    def contains(self, x, y):
+        # Crossing-number test, counting points on an edge as inside
+        vertices = self.dims
+        following = np.roll(vertices, -1, axis=0)
+        rel = vertices - [x, y]
+        cross = rel[:, 0]*(following[:, 1] - y) - rel[:, 1]*(following[:, 0] - x)
+        on_edge = (np.abs(cross) <= self.eps*np.hypot(*(following - vertices).T)) & \
+                  (np.sum(rel*(following - [x, y]), axis=1) <= 0)
+        if np.any(on_edge):
+            return True
+        straddles = (vertices[:, 1] > y) != (following[:, 1] > y)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            crossing_x = vertices[:, 0] + (y - vertices[:, 1])*(following[:, 0] - vertices[:, 0])/(following[:, 1] - vertices[:, 1])
+        return bool(np.count_nonzero(straddles & (crossing_x > x)) % 2)
+
+    def next_collision(self, x, y, vel_x, vel_y):
+        px, py, ex, ey, eps = self.px, self.py, self.ex, self.ey, self.eps
+        levels, leaf_size, count = self.tree.levels, self.tree.leaf_size, self.tree.count
+        leaves = len(levels) - 1
+        inv_x = 1/vel_x if vel_x else math.inf
+        inv_y = 1/vel_y if vel_y else math.inf
+        t_best, hit = math.inf, -1
+        stack = [(0.0, 0, 0)]  # (entry time, level, node), nearest box on top
+        while stack:
+            t_near, level, node = stack.pop()
+            if t_near > t_best:
+                continue
+            if level == leaves:
+                for i in range(node*leaf_size, min((node + 1)*leaf_size, count)):
+                    denom = vel_x*ey[i] - vel_y*ex[i]  # Cross product of the velocity and the edge
+                    if denom == 0:
+                        continue
+                    rel_x, rel_y = px[i] - x, py[i] - y
+                    t = (rel_x*ey[i] - rel_y*ex[i])/denom
+                    if eps < t < t_best:
+                        u = (rel_x*vel_y - rel_y*vel_x)/denom  # Fraction of the way along the edge
+                        if -1e-12 <= u <= 1 + 1e-12:
+                            t_best, hit = t, i
+                continue
+            lo_x, lo_y, hi_x, hi_y = levels[level + 1]
+            entered = []
+            for child in (2*node, 2*node + 1):
+                if child == len(lo_x):
+                    break
+                # Slab test: the range of t over which the ray is inside the child's box
+                if vel_x:
+                    t_0, t_1 = (lo_x[child] - x)*inv_x, (hi_x[child] - x)*inv_x
+                    t_near, t_far = (t_0, t_1) if t_0 < t_1 else (t_1, t_0)
+                elif lo_x[child] <= x <= hi_x[child]:
+                    t_near, t_far = -math.inf, math.inf
+                else:
+                    continue
+                if vel_y:
+                    t_0, t_1 = (lo_y[child] - y)*inv_y, (hi_y[child] - y)*inv_y
+                    if t_0 > t_1:
+                        t_0, t_1 = t_1, t_0
+                    t_near, t_far = max(t_near, t_0), min(t_far, t_1)
+                elif not lo_y[child] <= y <= hi_y[child]:
+                    continue
+                if t_far >= eps and t_near <= t_far + eps and t_near <= t_best:
+                    entered.append((t_near, level + 1, child))
+            if len(entered) == 2 and entered[0][0] < entered[1][0]:
+                entered.reverse()
+            stack.extend(entered)
+        if hit < 0:
+            raise RuntimeError(f"Ball at ({x}, {y}) escaped the polygon")
+        return t_best, self.norm_x[hit], self.norm_y[hit], hit
+
+    def outline(self):
+        closed = np.concatenate([self.dims, self.dims[:1]])
+        return closed[:, 0], closed[:, 1]
+
+    def arc_length(self, x, y, wall):
+        wall = np.asarray(wall)
+        return self.cumulative[wall] + np.hypot(x - self.dims[wall, 0], y - self.dims[wall, 1])
+
+    def s_max(self):
+        return float(self.cumulative[-1])
+
+class UniformGrid:
+    """Cell list: a uniform grid over a box, each cell listing the items whose boxes overlap it.
+
+    Rays are walked through the cells they cross in order (Amanatides & Woo), so a collision
+    search only tests items near the ray. Suited to items spread over the whole box, where
+    a ray crosses few cells before hitting something.
+    """
+    def __init__(self, lo_x, lo_y, hi_x, hi_y, cells):
+        # About `cells` near-square cells
+        self.lo_x, self.lo_y = lo_x, lo_y
+        self.width, self.height = hi_x - lo_x, hi_y - lo_y
+        size = math.sqrt(self.width*self.height/max(cells, 1))
+        self.nx, self.ny = max(1, round(self.width/size)), max(1, round(self.height/size))
+        self.cell_w, self.cell_h = self.width/self.nx, self.height/self.ny
+        self.cells = [[] for _ in range(self.nx*self.ny)]
+
+    def _index(self, x, y):
+        ix = min(max(int((x - self.lo_x)//self.cell_w), 0), self.nx - 1)
+        iy = min(max(int((y - self.lo_y)//self.cell_h), 0), self.ny - 1)
+        return ix, iy
+
+    def insert(self, item, lo_x, lo_y, hi_x, hi_y):
+        """Add item to every cell overlapping the box [lo_x, hi_x] x [lo_y, hi_y]."""
+        ix0, iy0 = self._index(lo_x, lo_y)
+        ix1, iy1 = self._index(hi_x, hi_y)
+        for ix in range(ix0, ix1 + 1):
+            for iy in range(iy0, iy1 + 1):
+                self.cells[ix*self.ny + iy].append(item)
+
+    def items_at(self, x, y):
+        ix, iy = self._index(x, y)
+        return self.cells[ix*self.ny + iy]
+
+    def walk(self, x, y, vel_x, vel_y, periodic=False):
+        """Yields (items, t_exit, shift_x, shift_y) for each cell along pos + vel*t, t >= 0, in order.
+
+        Stops when the ray leaves the box, unless periodic, in which case it re-enters on the
+        opposite side and walks on indefinitely; shift is then the offset of the current copy of
+        the box from the one containing pos.
+        """
+        ix, iy = self._index(x, y)
+        step_x = 1 if vel_x > 0 else -1
+        step_y = 1 if vel_y > 0 else -1
+        # Time at which the ray crosses the next vertical (t_x) and horizontal (t_y) grid line
+        t_x = (self.lo_x + (ix + (vel_x > 0))*self.cell_w - x)/vel_x if vel_x else math.inf
+        t_y = (self.lo_y + (iy + (vel_y > 0))*self.cell_h - y)/vel_y if vel_y else math.inf
+        dt_x = self.cell_w/abs(vel_x) if vel_x else math.inf
+        dt_y = self.cell_h/abs(vel_y) if vel_y else math.inf
+        shift_x = shift_y = 0.0
+        while True:
+            if t_x < t_y:
+                yield self.cells[ix*self.ny + iy], t_x, shift_x, shift_y
+                ix += step_x
+                t_x += dt_x
+                if not 0 <= ix < self.nx:
+                    if not periodic:
+                        return
+                    ix -= step_x*self.nx
+                    shift_x += step_x*self.width
+            else:
+                yield self.cells[ix*self.ny + iy], t_y, shift_x, shift_y
+                iy += step_y
+                t_y += dt_y
+                if not 0 <= iy < self.ny:
+                    if not periodic:
+                        return
+                    iy -= step_y*self.ny
+                    shift_y += step_y*self.height
+
+def lorentz_dims(width, height, scatterers, periodic=False):
+    """Dims for a LorentzGas table from its size and an (N, 3) array of scatterers (x, y, radius)."""
+    return np.concatenate([[[width, height, float(periodic)]], np.reshape(scatterers, (-1, 3))])
+
+def random_scatterers(width, height, count, radius, seed=None, max_tries=100000):
+    """count non-overlapping scatterers of the given radius placed uniformly at random on the table.
+
+    Scatterers keep clear of the walls, so the table stays connected whether or not it is periodic.
+    """
+    rng = np.random.default_rng(seed)
+    centres = np.empty((0, 2))
+    for _ in range(max_tries):
+        if len(centres) == count:
+            return np.column_stack([centres, np.full(count, radius)])
+        centre = rng.uniform([-width/2 + radius, -height/2 + radius], [width/2 - radius, height/2 - radius])
+        if not len(centres) or np.min(np.hypot(*(centres - centre).T)) > 2*radius:
+            centres = np.vstack([centres, centre])
+    raise ValueError(f"Could only place {len(centres)} of {count} scatterers of radius {radius}")
+
+@register("lorentz")
+class LorentzGas(Geometry):
+    """Sinai/Lorentz-gas table: a width x height rectangle with circular scatterers inside.
+
+    dims is an (N+1, 3) array: the first row is (width, height, periodic) and the rest are the
+    scatterers (x, y, radius); see lorentz_dims. The scatterers are kept in a UniformGrid cell
+    list with about one cell per scatterer, so each flight only tests the scatterers in the
+    cells it crosses and the cost per collision stays roughly constant as N grows.
+
+    Walls 0-3 are the rectangle sides as for the rectangle table and wall 4 + k is scatterer k.
+    s runs anticlockwise around the rectangle from the middle of its right side, then around
+    each scatterer in turn, clockwise so that the table always lies on the left. If periodic,
+    the sides are not walls: the ball leaves through one side and re-enters through the
+    opposite one, and positions are kept unfolded (they keep growing as the ball crosses
+    copies of the table) so trajectories and diffusion can be studied directly.
+    """
+    max_flight = 1e6  # Longest free flight in table diameters before giving up, for periodic tables
+
+    def __init__(self, dims):
+        dims = np.asarray(dims, dtype=float)
+        if dims.ndim != 2 or dims.shape[1] != 3 or len(dims) < 1:
+            raise ValueError(f"LorentzGas needs an (N+1, 3) array of dims (see lorentz_dims), got {dims.shape}")
+        width, height, periodic = dims[0].tolist()
+        scatterers = dims[1:]
+        if width <= 0 or height <= 0 or np.any(scatterers[:, 2] <= 0):
+            raise ValueError("LorentzGas needs a positive width and height and positive scatterer radii")
+        self.dims = dims
+        self._outline = None
+        self.half_width, self.half_height = float(width)/2, float(height)/2
+        self.periodic = bool(periodic)
+        self.radius = scatterers[:, 2].tolist()
+        self.offsets = (2*(width + height) + np.concatenate([[0], np.cumsum(2*np.pi*scatterers[:, 2])])).tolist()
+        # Each scatterer is stored once per copy of it overlapping the table, so with periodic
+        # sides a scatterer straddling a side is also found through the opposite side
+        self.cx, self.cy, self.owner = [], [], []
+        self.grid = UniformGrid(-self.half_width, -self.half_height, self.half_width, self.half_height, len(scatterers))
+        shifts = [-1, 0, 1] if self.periodic else [0]
+        for k, (x, y, r) in enumerate(scatterers.tolist()):
+            for shift_x in shifts:
+                for shift_y in shifts:
+                    x_copy, y_copy = x + shift_x*width, y + shift_y*height
+                    if abs(x_copy) - r < self.half_width and abs(y_copy) - r < self.half_height:
+                        self.grid.insert(len(self.owner), x_copy - r, y_copy - r, x_copy + r, y_copy + r)
+                        self.cx.append(x_copy)
+                        self.cy.append(y_copy)
+                        self.owner.append(k)
+        self.eps = 1e-12*math.hypot(width, height)
+
+    @classmethod
+    def prompt(cls):
+        width = utils.input_test("Table width: ", integer=False, positive=True)
+        height = utils.input_test("Table height: ", integer=False, positive=True)
+        periodic = utils.input_test("Periodic sides (1 for yes, 0 for no): ", positive=True)
+        count = utils.input_test("Number of scatterers: ", positive=True)
+        radius = utils.input_test("Scatterer radius: ", integer=False, positive=True)
+        return lorentz_dims(width, height, random_scatterers(width, height, count, radius), periodic)
+
+    def _fold(self, x, y):
+        # Position in the copy of the table centred on the origin
+        width, height = 2*self.half_width, 2*self.half_height
+        return (x + self.half_width) % width - self.half_width, (y + self.half_height) % height - self.half_height
+
+    def contains(self, x, y):
+        if self.periodic:
+            x, y = self._fold(x, y)
+        elif abs(x) > self.half_width or abs(y) > self.half_height:
+            return False
+        return all((x - self.cx[i])**2 + (y - self.cy[i])**2 >= self.radius[self.owner[i]]**2 for i in self.grid.items_at(x, y))
+
+    def next_collision(self, x, y, vel_x, vel_y):
+        cx, cy, radius, owner, eps = self.cx, self.cy, self.radius, self.owner, self.eps
+        if self.periodic:
+            x_start, y_start = self._fold(x, y)
+            t_best, norm_x, norm_y, wall = math.inf, 0.0, 0.0, -1
+            t_limit = self.max_flight*2*math.hypot(self.half_width, self.half_height)
+        else:
+            # The side the ball is heading towards, unless a scatterer is hit first
+            x_start, y_start = x, y
+            t_x = ((self.half_width if vel_x > 0 else -self.half_width) - x)/vel_x if vel_x else math.inf
+            t_y = ((self.half_height if vel_y > 0 else -self.half_height) - y)/vel_y if vel_y else math.inf
+            if t_x <= t_y:  # Sides win ties, as in the rectangle engine
+                t_best, norm_x, norm_y, wall = max(t_x, 0), (1.0 if vel_x > 0 else -1.0), 0.0, (0 if vel_x > 0 else 2)
+            else:
+                t_best, norm_x, norm_y, wall = max(t_y, 0), 0.0, (1.0 if vel_y > 0 else -1.0), (1 if vel_y > 0 else 3)
+            t_limit = math.inf
+        for items, t_exit, shift_x, shift_y in self.grid.walk(x_start, y_start, vel_x, vel_y, self.periodic):
+            for i in items:
+                # Nearer root of |pos + vel*t - centre| = radius, approaching from outside
+                rel_x, rel_y = x_start - cx[i] - shift_x, y_start - cy[i] - shift_y
+                half_b = rel_x*vel_x + rel_y*vel_y
+                if half_b >= 0:
+                    continue  # Moving away from this scatterer
+                r = radius[owner[i]]
+                disc = half_b*half_b - (rel_x*rel_x + rel_y*rel_y - r*r)
+                if disc < 0:
+                    continue
+                t = (rel_x*rel_x + rel_y*rel_y - r*r)/(math.sqrt(disc) - half_b)  # Nearer root, without cancellation
+                if eps < t < t_best:
+                    t_best, wall = t, 4 + owner[i]
+                    # Outward normal of the table, which points into the scatterer
+                    norm_x, norm_y = -(rel_x + vel_x*t), -(rel_y + vel_y*t)
+                    dist = math.hypot(norm_x, norm_y)  # Equal to r up to rounding
+                    norm_x, norm_y = norm_x/dist, norm_y/dist
+            if t_best <= t_exit:
+                break
+            if t_exit > t_limit:
+                raise RuntimeError(f"No scatterer hit within {self.max_flight:g} table diameters of ({x}, {y})")
+        return t_best, norm_x, norm_y, wall
+
+    def outline(self):
+        # Rectangle then each scatterer, separated by NaNs so they plot as separate lines
+        w, h = self.half_width, self.half_height
+        xs, ys = [np.array([w, w, -w, -w, w, w]), [np.nan]], [np.array([0, h, h, -h, -h, 0]), [np.nan]]
+        theta = np.linspace(0, 2*np.pi, 65)
+        for x, y, r in self.dims[1:]:
+            xs += [x + r*np.cos(theta), [np.nan]]
+            ys += [y + r*np.sin(theta), [np.nan]]
+        return np.concatenate(xs[:-1]), np.concatenate(ys[:-1])
+
+    def arc_length(self, x, y, wall):
+        x, y, wall = np.asarray(x, dtype=float), np.asarray(y, dtype=float), np.asarray(wall)
+        w, h = self.half_width, self.half_height
+        if self.periodic:
+            x, y = self._fold(x, y)
+        # Rectangle sides, anticlockwise from the middle of the right side
+        side = np.select([wall == 0, wall == 1, wall == 2, wall == 3],
+                         [np.mod(y, 4*(w + h)), h + w - x, 2*w + 2*h - y, 3*w + 3*h + x])
+        # Scatterers, clockwise from each one's right-most point
+        k = np.clip(wall - 4, 0, len(self.radius) - 1)
+        centres = self.dims[1:][k] if len(self.radius) else np.zeros(wall.shape + (3,))
+        rel_x, rel_y = x - centres[..., 0], y - centres[..., 1]
+        if self.periodic:  # The hit may be on a copy of the scatterer across a side
+            rel_x = (rel_x + w) % (2*w) - w
+            rel_y = (rel_y + h) % (2*h) - h
+        scatterer = np.asarray(self.offsets)[k] + centres[..., 2]*np.mod(-np.arctan2(rel_y, rel_x), 2*np.pi)
+        return np.where(wall >= 4, scatterer, side)
+
+    def s_max(self):
+        return float(self.offsets[-1])
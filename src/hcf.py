@@ -0,0 +1,74 @@
+import numpy as np
+
+# Corners of the table by number, anticlockwise from the top right. The ball starts in the
+# bottom-left corner, which it can never come back to.
+CORNERS = ("top right", "top left", "bottom left", "bottom right")
+
+def hcf(m, n):
+    """Highest Common Factor by Rectangle Billiards
+
+    A ball launched at 45 degrees from the bottom-left corner of an m x n table travels, once the
+    table is unfolded, along the line y = x until it first meets a corner of the tiling at
+    (L, L), L = lcm(m, n); there it leaves the table through a corner, having bounced
+    L/m + L/n - 2 times, and hcf(m, n) = m*n/L. Cutting the n x n squares off the end of the
+    table does not move the corner the ball reaches, so L is found exactly in integers by
+    Euclid's reduction (m, n) -> (n, m mod n), applied to whole arrays of tables at once.
+
+    Parameters
+    ----------
+        m: int or array
+            table widths, positive integers
+        n: int or array
+            table heights, positive integers of the same shape as m
+
+    Returns
+    -------
+        hcf: int or array
+            highest common factor of each m and n
+        bounces: int or array
+            number of collisions with the sides before the ball reaches a corner
+        corner: int or array
+            index into CORNERS of the corner the ball reaches
+    """
+    m, n = _integers(m), _integers(n)
+    if np.any(m <= 0) or np.any(n <= 0):
+        raise ValueError("Table sides must be positive integers")
+    a, b = np.broadcast_arrays(m, n)
+    a, b = a.ravel().copy(), b.ravel().copy()
+    active = np.arange(a.size)
+    while active.size:
+        # Only tables still being reduced are touched, so each pass shrinks with the batch
+        remainder = a[active] % b[active]
+        a[active] = b[active]
+        b[active] = remainder
+        active = active[remainder != 0]
+    factor = a.reshape(np.broadcast(m, n).shape)
+    widths, heights = n//factor, m//factor  # Number of table widths and heights the ball crosses
+    bounces = widths + heights - 2
+    right, top = widths % 2 == 1, heights % 2 == 1
+    corner = np.where(top, np.where(right, 0, 1), np.where(right, 3, 2))
+    if factor.ndim == 0:
+        return int(factor), int(bounces), int(corner)
+    return factor, bounces, corner
+
+def _integers(values):
+    # Whole numbers as int64, refusing anything that would be truncated
+    values = np.asarray(values)
+    if values.dtype.kind not in "iu":
+        if values.dtype.kind not in "fb" or not np.all(np.isfinite(values)) or np.any(values != np.round(values)):
+            raise ValueError("Table sides must be positive integers")
+    return values.astype(np.int64)
+
+def load_pairs(path):
+    """Read integer pairs m, n from a text file, one pair per line, separated by spaces or a comma."""
+    with open(path, encoding="utf-8") as f:
+        values = np.array(f.read().replace(",", " ").split(), dtype=np.int64)
+    if values.size % 2:
+        raise ValueError(f"{path} does not hold whole pairs of integers")
+    return values.reshape(-1, 2)
+
+def verify(m, n, factor):
+    """Indices of the pairs whose factor disagrees with math.gcd."""
+    from math import gcd
+    expected = np.frompyfunc(gcd, 2, 1)(np.asarray(m, dtype=object), np.asarray(n, dtype=object)).astype(np.int64)
+    return np.flatnonzero(expected != factor)
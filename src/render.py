@@ -0,0 +1,129 @@
+import math
+import numpy as np
+# Only imported when plotting, so matplotlib is loaded here directly
+from matplotlib.artist import Artist
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+def flights(x, y, index):
+    """Line data for the flights (chords from collision k to k+1) starting at each k in index,
+    separated by NaN so that no chord is drawn between one flight and the next."""
+    index = np.asarray(index, dtype=np.int64)
+    gap = np.full(len(index), np.nan)
+    return (np.column_stack((x[index], x[index + 1], gap)).ravel(),
+            np.column_stack((y[index], y[index + 1], gap)).ravel())
+
+class History(Artist):
+    """Flights retired from an animation, painted once onto an offscreen canvas the size of the
+    axes in pixels and copied into the axes as they are, without resampling, at each draw.
+
+    The canvas is only repainted from scratch when the axes change size (a resized window or
+    a different dpi when saving); otherwise paint() adds the new flights to it.
+    """
+    def __init__(self, x, y, stride=1, color=None, alpha=0.6, **line_kwargs):
+        super().__init__()
+        self.x, self.y = x, y
+        self.stride = stride
+        self.alpha = alpha
+        self.offscreen = Figure()
+        self.canvas = FigureCanvasAgg(self.offscreen)
+        self.offscreen.patch.set_alpha(0)
+        self.offscreen_ax = self.offscreen.add_axes((0, 0, 1, 1))
+        self.offscreen_ax.set_axis_off()
+        self.line, = self.offscreen_ax.plot([], [], color=color, **line_kwargs)
+        self.next_index = 0  # Next flight to consider painting
+        self.size = None  # Canvas size in pixels, set at the first draw
+        self.pixels = None  # Canvas contents as drawn into the axes, rebuilt after painting
+
+    def paint(self, stop):
+        """Add every stride-th flight starting before stop to the canvas."""
+        new_index = np.arange(self.next_index, stop, self.stride)
+        if len(new_index):
+            self.next_index = new_index[-1] + self.stride
+            if self.size is not None:
+                self._draw_flights(new_index)
+
+    def reset(self):
+        self.next_index = 0
+        self.size = None
+
+    def _draw_flights(self, index):
+        self.line.set_data(*flights(self.x, self.y, index))
+        self.offscreen_ax.draw_artist(self.line)
+        self.pixels = None
+
+    def draw(self, renderer):
+        box = self.axes.bbox
+        size = (max(int(round(box.width)), 1), max(int(round(box.height)), 1))
+        if size != self.size:  # Repaint everything so far at the new size
+            dpi = self.axes.figure.dpi
+            self.offscreen.set_dpi(dpi)
+            self.offscreen.set_size_inches(size[0]/dpi, size[1]/dpi)
+            self.offscreen_ax.set_xlim(self.axes.get_xlim())
+            self.offscreen_ax.set_ylim(self.axes.get_ylim())
+            self.line.set_data([], [])
+            self.canvas.draw()
+            self.size = size
+            self._draw_flights(np.arange(0, self.next_index, self.stride))
+        if self.pixels is None:
+            self.pixels = np.asarray(self.canvas.buffer_rgba())[::-1].copy()  # Bottom row first, as draw_image expects
+            self.pixels[..., 3] = self.pixels[..., 3]*self.alpha
+        gc = renderer.new_gc()
+        gc.set_clip_rectangle(box)
+        renderer.draw_image(gc, box.x0, box.y0, self.pixels)
+        gc.restore()
+        self.stale = False
+
+class IncrementalTrajectory:
+    """Animation updater that draws a long trajectory a batch of collisions per frame.
+
+    The newest flights of each batch (at most max_recent) are drawn on their own line. Every
+    stride-th flight is painted onto a History as it retires, with the stride fixed so that
+    at most max_history flights are painted over the whole run. Each frame therefore draws a
+    bounded number of flights plus one image copy, however many collisions came before, and
+    no chord is drawn that the ball did not travel.
+    """
+    def __init__(self, ax, x, y, frame_budget=500, max_history=20000, max_recent=100, **line_kwargs):
+        self.x, self.y = x, y
+        self.per_frame = max(1, math.ceil((len(x) - 1)/frame_budget))  # Collisions added each frame
+        self.frames = max(1, math.ceil((len(x) - 1)/self.per_frame))
+        self.max_recent = max_recent
+        self.recent_line, = ax.plot([], [], **line_kwargs)
+        self.history = History(x, y, max(1, math.ceil((len(x) - 1)/max_history)), self.recent_line.get_color(), **line_kwargs)
+        self.history.set_zorder(self.recent_line.get_zorder() - 0.1)
+        ax.add_artist(self.history)
+
+    def __call__(self, frame):
+        start = frame*self.per_frame
+        stop = min(start + self.per_frame, len(self.x) - 1)
+        if start < self.history.next_index - self.history.stride:  # Restarted animation
+            self.history.reset()
+        self.history.paint(start)
+        recent = max(start, stop - self.max_recent)
+        self.recent_line.set_data(self.x[recent:stop + 1], self.y[recent:stop + 1])
+        return self.history, self.recent_line
+
+class PhaseDensity:
+    """Phase-space (s, cos θ) density, accumulated incrementally into a fixed 2D histogram.
+
+    Points can be added in any number of chunks (streamed runs or memory-mapped
+    trajectories), and memory and drawing time depend only on the number of bins.
+    """
+    def __init__(self, s_max, bins=(400, 200)):
+        self.extent = (0, s_max, -1, 1)
+        self.bins = bins
+        self.counts = np.zeros((bins[1], bins[0]), dtype=np.int64)  # Rows are cos θ, columns are s
+
+    def add(self, s, cos):
+        counts, _, _ = np.histogram2d(cos, s, bins=(self.bins[1], self.bins[0]), range=[self.extent[2:], self.extent[:2]])
+        self.counts += counts.astype(np.int64)
+
+    def add_trajectory(self, trajectory, chunk_size=1000000):
+        s, cos = trajectory.phase_space
+        for start in range(0, len(s), chunk_size):
+            self.add(s[start:start + chunk_size], cos[start:start + chunk_size])
+
+    def show(self, ax, cmap="viridis"):
+        from matplotlib.colors import LogNorm
+        return ax.imshow(np.ma.masked_equal(self.counts, 0), origin="lower", extent=self.extent, cmap=cmap,
+                         norm=LogNorm(vmin=1, vmax=max(self.counts.max(), 1)), interpolation="nearest")
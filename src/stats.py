@@ -0,0 +1,54 @@
+import json
+from collections import defaultdict
+from time import perf_counter
+import tracemalloc
+
+class RunStats:
+    """Timings and counters gathered by an instrumented Table (see Table.instrument).
+
+    timings holds seconds spent in each phase of the calc loops (search, reflection,
+    phase_space, store, period); counts holds engine calls, collisions, trajectory buffer
+    allocations and the lengths of periodic orbits found. With track_allocations, tracemalloc also records the peak memory
+    allocated while the engines run; tracemalloc slows the loops down, so timings
+    taken alongside it are inflated.
+    """
+    def __init__(self, track_allocations=False):
+        self.timings = defaultdict(float)
+        self.counts = defaultdict(int)
+        self.track_allocations = track_allocations
+        self.peak_memory_bytes = 0
+
+    def lap(self, phase, since):
+        # Adds the time since the last lap to phase and starts the next lap
+        now = perf_counter()
+        self.timings[phase] += now - since
+        return now
+
+    def count(self, name, n=1):
+        self.counts[name] += n
+
+    def start_tracking(self):
+        if self.track_allocations and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            return True
+        return False
+
+    def stop_tracking(self, started):
+        if started:
+            self.peak_memory_bytes = max(self.peak_memory_bytes, tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+
+    def as_dict(self):
+        return {"timings": dict(self.timings), "counts": dict(self.counts), "peak_memory_bytes": self.peak_memory_bytes}
+
+    def dump(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.as_dict(), f, indent=1)
+
+    def __str__(self):
+        total = sum(self.timings.values()) or 1
+        lines = [f"{phase:12s} {seconds:10.4f} s  {100*seconds/total:5.1f}%" for phase, seconds in self.timings.items()]
+        lines += [f"{name:12s} {value:10d}" for name, value in self.counts.items()]
+        if self.track_allocations:
+            lines.append(f"{'peak memory':12s} {self.peak_memory_bytes:10d} bytes")
+        return "\n".join(lines)
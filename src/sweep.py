@@ -0,0 +1,51 @@
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import os
+import numpy as np
+from src import ball, table
+from src.trajectory import START, TRAJECTORY_DTYPE, Trajectory
+
+def sweep(jobs, max_workers=None):
+    """Run many independent billiards simulations across a process pool.
+
+    jobs is an iterable of (geometry, dims, pos, angle, reflections). Workers write
+    their trajectories straight into one shared-memory record array, so only job
+    descriptions cross process boundaries. Returns one Trajectory per job, in job
+    order, each with a header describing its job.
+    """
+    jobs = [(geometry, list(dims), list(pos), angle, int(reflections)) for geometry, dims, pos, angle, reflections in jobs]
+    offsets = np.cumsum([0] + [job[4] + 1 for job in jobs])
+    total = int(offsets[-1])
+    shm = shared_memory.SharedMemory(create=True, size=max(total*TRAJECTORY_DTYPE.itemsize, 1))
+    try:
+        records = np.ndarray(total, dtype=TRAJECTORY_DTYPE, buffer=shm.buf)
+        records["s"] = records["cos"] = np.nan
+        records["wall"] = START
+        workers = max_workers or os.cpu_count() or 1
+        with ProcessPoolExecutor(workers) as pool:
+            args = [(shm.name, total, int(offset), job) for offset, job in zip(offsets, jobs)]
+            list(pool.map(_run_job, args, chunksize=max(1, len(jobs)//(4*workers))))
+        records = records.copy()  # Detach from the shared block before it is released
+    finally:
+        shm.close()
+        shm.unlink()
+    trajectories = []
+    for (geometry, dims, pos, angle, reflections), start, stop in zip(jobs, offsets[:-1], offsets[1:]):
+        header = {"geometry": geometry, "dims": dims, "init_pos": pos, "angle": angle,
+                  "reflections": reflections, "phase": geometry != "rectangle"}
+        trajectories.append(Trajectory(records=records[start:stop], header=header))
+    return trajectories
+
+def _run_job(args):
+    shm_name, total, offset, (geometry, dims, pos, angle, reflections) = args
+    shm = shared_memory.SharedMemory(name=shm_name)  # Registered with the parent's resource tracker, which unlinks it
+    try:
+        records = np.ndarray(total, dtype=TRAJECTORY_DTYPE, buffer=shm.buf)
+        billiards_table = table.Table(geometry, dims=dims)
+        billiards_table.reflections = reflections
+        billiards_ball = ball.Ball(billiards_table, pos=pos, angle=angle)
+        billiards_table.calc(billiards_ball, out=Trajectory(records=records[offset:offset + reflections + 1]))
+        del records, billiards_table  # Release views of the buffer so it can be closed
+    finally:
+        shm.close()
+
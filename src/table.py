@@ -1,17 +1,36 @@
+import math
+from time import perf_counter
 import numpy as np
-import matplotlib.pyplot as plt
-from matplotlib import animation
-from matplotlib.patches import Rectangle
-from scipy import integrate
-from src import utils
+from src import ensemble, geometry as geometries, utils
+from src.stats import RunStats
+from src.trajectory import TRAJECTORY_DTYPE, Trajectory
 
 class Table:
-    def __init__(self, geometry):
+    def __init__(self, geometry, dims=None):
         self.geometry = geometry
         self.reflections = 0
         self.collisions = []
         self.phase_space = []
-        if self.geometry == "rectangle":
+        self.trajectory = None
+        self.stats = None
+        self.shape = None
+        self.period = None  # Period of the last rectangle run, if it was found to be periodic
+        self.period_tolerance = 1e-9  # Relative to the table size
+        self.max_period = 100000  # Collisions searched for a recurring state before giving up
+        if self.geometry in geometries.GEOMETRIES:
+            # Registered shapes validate their own dims and run on the generic engine
+            shape_class = geometries.GEOMETRIES[self.geometry]
+            if dims is None:
+                dims = shape_class.prompt()
+            self.shape = shape_class(dims)
+            self.dims = self.shape.dims
+        elif dims is not None:
+            self.dims = np.array(dims)
+            if self.dims.shape != (2,) or np.any(self.dims <= 0):
+                raise ValueError(f"Table dimensions must be two positive numbers, got {dims}")
+            if self.geometry == "elliptical" and self.dims[0] < self.dims[1]:
+                raise ValueError("Semi-major axis must be larger than semi-minor axis")
+        elif self.geometry == "rectangle":
             width = utils.input_test("Table width (positive integer): ", positive=True)
             height = utils.input_test("Table height (positive integer): ", positive=True)
             self.dims = np.array([width, height])
@@ -29,13 +48,214 @@ class Table:
             self.dims = np.array([width, height])
 
     
-    def rectangle_calc(self, ball):
+    def calc(self, ball, phase=True, out=None):
+        """Run the exact engine for this table's geometry; out is an optional preallocated Trajectory."""
+        self._calc(self._engine(), ball, phase and self.geometry != "rectangle", out)
+
+    def _engine(self):
+        if self.shape is not None:
+            return self._plugin_run
+        return {"rectangle": self._rectangle_run, "elliptical": self._elliptical_run, "stadium": self._stadium_run}[self.geometry]
+
+    def instrument(self, enabled=True, track_allocations=False):
+        """Start (or stop) gathering per-phase timings and counters into self.stats, a RunStats."""
+        self.stats = RunStats(track_allocations) if enabled else None
+        return self.stats
+
+    def _run(self, run, ball, out, start, stop, phase):
+        if self.stats is None:
+            run(ball, out, start, stop, phase)
+            return
+        tracking = self.stats.start_tracking()
+        run(ball, out, start, stop, phase)
+        self.stats.stop_tracking(tracking)
+        self.stats.count("calls")
+        self.stats.count("collisions", stop - start)
+
+    def _new_trajectory(self, length):
+        if self.stats is not None:
+            self.stats.count("allocations")
+            self.stats.count("allocated_bytes", length*TRAJECTORY_DTYPE.itemsize)
+        return Trajectory(length)
+
+    def _calc(self, run, ball, phase, out=None):
+        # Write the starting position then every collision straight into a preallocated trajectory
+        self.trajectory = self._new_trajectory(self.reflections + 1) if out is None else out
+        self.trajectory.x[0], self.trajectory.y[0] = ball.pos
+        self._run(run, ball, self.trajectory, 1, self.reflections + 1, phase)
+        self.collisions = self.trajectory.collisions
+        if phase:
+            self.phase_space = self.trajectory.phase_space
+
+    def rectangle_calc(self, ball, exact=True, step=1e-3):
+        """Exact rectangle run. If the orbit turns out to be periodic (to within period_tolerance
+        of the table size, checked over the first max_period collisions), self.period is set to
+        its length in collisions and the rest of the run is filled by repeating the cycle."""
+        if not exact:
+            self._rectangle_sampled(ball, step)
+            return
+        self._calc(self._rectangle_run, ball, phase=False)
+
+    def _rectangle_run(self, ball, out, start, stop, phase=False):
+        half_width, half_height = float(self.dims[0])/2, float(self.dims[1])/2
+        x, y = float(ball.pos[0]), float(ball.pos[1])
+        vel_x, vel_y = float(ball.vel[0]), float(ball.vel[1])
+        # Launches along an axis leave a rounding residue (cos 270 degrees is -1.8e-16) in the other
+        # component, which would otherwise count as a zero-time hit on a wall the ball starts on
+        vel_x = 0.0 if abs(vel_x) < 1e-15 else vel_x
+        vel_y = 0.0 if abs(vel_y) < 1e-15 else vel_y
+        xs, ys, walls = out.x, out.y, out.wall
+        # Hits on the right (or, if the ball crosses the table faster vertically, the top) wall seen
+        # so far, quantised to period_tolerance, for spotting periodic orbits. Speeds along each axis
+        # never change and the wall fixes one coordinate and one velocity sign, so the other
+        # coordinate and sign, packed into one int, complete the state
+        scale = 1/(self.period_tolerance*max(half_width, half_height))
+        track_side = abs(vel_x)*half_height >= abs(vel_y)*half_width
+        seen = {}
+        search_until = start + self.max_period
+        self.period = None
+        stats = self.stats
+        lap = perf_counter()
+        for i in range(start, stop):
+            # Time until the ball reaches the side (t_x) and top/bottom (t_y) it is heading towards
+            t_x = max(((half_width if vel_x > 0 else -half_width) - x)/vel_x, 0) if vel_x else np.inf
+            t_y = max(((half_height if vel_y > 0 else -half_height) - y)/vel_y, 0) if vel_y else np.inf
+            if stats: lap = stats.lap("search", lap)
+            state = None
+            if t_x <= t_y:  # Sides win ties, so a corner counts as a side then a top/bottom collision
+                y += vel_y*t_x
+                if vel_x > 0:
+                    x = half_width
+                    walls[i] = 0
+                    if track_side: state = 2*round(y*scale) + (vel_y > 0)
+                else:
+                    x = -half_width
+                    walls[i] = 2
+                vel_x = -vel_x
+            else:
+                x += vel_x*t_y
+                if vel_y > 0:
+                    y = half_height
+                    walls[i] = 1
+                    if not track_side: state = 2*round(x*scale) + (vel_x > 0)
+                else:
+                    y = -half_height
+                    walls[i] = 3
+                vel_y = -vel_y
+            if stats: lap = stats.lap("reflection", lap)
+            xs[i] = x
+            ys[i] = y
+            if stats: lap = stats.lap("store", lap)
+            if state is not None and i < search_until:
+                first = seen.setdefault(state, i)
+                if first != i:
+                    self.period = i - first
+                    if stats: stats.count("period", self.period)
+                    if stop > i + 1:
+                        x, y, vel_x, vel_y = self._tile_cycle(out, first, i, stop, vel_x, vel_y)
+                    break
+            if stats: lap = stats.lap("period", lap)
+        ball.pos = [x, y]
+        ball.vel = [vel_x, vel_y]
+
+    def _tile_cycle(self, out, first, last, stop, vel_x, vel_y):
+        # The state after collision last recurs that after collision first, so collisions first+1..last
+        # repeat for the rest of the run; returns the position and velocity after the final one
+        cycle = first + 1 + (np.arange(last + 1, stop) - first - 1) % (last - first)
+        out.x[last + 1:stop], out.y[last + 1:stop], out.wall[last + 1:stop] = out.x[cycle], out.y[cycle], out.wall[cycle]
+        # Each velocity component points away from the wall last hit along its axis; if the partial
+        # cycle hits no such wall, it is as it was at the start of the cycle, which is as it is now
+        walls = out.wall[first + 1:cycle[-1] + 1]
+        sides, ends = walls[(walls == 0) | (walls == 2)], walls[(walls == 1) | (walls == 3)]
+        if len(sides):
+            vel_x = -abs(vel_x) if sides[-1] == 0 else abs(vel_x)
+        if len(ends):
+            vel_y = -abs(vel_y) if ends[-1] == 1 else abs(vel_y)
+        return float(out.x[stop - 1]), float(out.y[stop - 1]), vel_x, vel_y
+
+    def rectangle_jump(self, ball, index):
+        """Rectangle collisions by index, computed directly by unfolding the table.
+
+        Index 0 is the starting position, as in self.collisions. index may be an
+        int, a slice (open-ended slices stop at self.reflections) or an array of
+        ints; the result is [x, y] for an int and [xs, ys] arrays otherwise.
+        Negative indices count back from self.reflections as in Python; positive
+        ones may go beyond it, up to 2**53.
+        """
+        length = self.reflections + 1
+        if isinstance(index, slice):
+            step = 1 if index.step is None else index.step
+            if step == 0:
+                raise ValueError("slice step cannot be zero")
+            start, stop = index.start, index.stop
+            start = (0 if step > 0 else length - 1) if start is None else start + length if start < 0 else start
+            stop = (length if step > 0 else -1) if stop is None else stop + length if stop < 0 else stop
+            indices = np.arange(max(start, 0 if step > 0 else -1), max(stop, 0 if step > 0 else -1), step, dtype=np.int64)
+        else:
+            indices = np.asarray(index, dtype=np.int64)
+            indices = np.where(indices < 0, indices + length, indices)
+            if np.any(indices < 0):
+                raise IndexError(f"Collision index {index} out of range for {self.reflections} reflections")
+        if np.any(indices >= 2**53):
+            raise ValueError("Collision indices must be below 2**53")
+        n = indices - 1  # Number of collisions before the one wanted
+        half_width, half_height = float(self.dims[0])/2, float(self.dims[1])/2
+        x0, y0 = float(ball.init_pos[0]), float(ball.init_pos[1])
+        vel_x, vel_y = np.cos(np.radians(ball.angle)), np.sin(np.radians(ball.angle))
+        vel_x = 0.0 if abs(vel_x) < 1e-15 else vel_x  # As in the engine
+        vel_y = 0.0 if abs(vel_y) < 1e-15 else vel_y
+        sign_x, sign_y = (1.0 if vel_x > 0 else -1.0), (1.0 if vel_y > 0 else -1.0)
+        x = np.full(n.shape, x0)
+        y = np.full(n.shape, y0)
+        later = n >= 0
+
+        # Collisions are counted in whole walls along each axis and positions come from the exact
+        # remainder of the distance travelled, so no huge time or distance is ever rounded
+        if not vel_y:  # Side to side only
+            x[later] = sign_x*half_width*(-1.0)**(n[later] % 2)
+        elif not vel_x:  # Top to bottom only
+            y[later] = sign_y*half_height*(-1.0)**(n[later] % 2)
+        else:
+            speed_x, speed_y = abs(float(vel_x)), abs(float(vel_y))
+            # Distance to the first wall along each axis and the distance travelled along one axis
+            # per unit along the other, as unevaluated float pairs
+            to_side = utils.two_sum(half_width, -sign_x*x0)
+            to_end = utils.two_sum(half_height, -sign_y*y0)
+            y_per_x, x_per_y = _ratio(speed_y, speed_x), _ratio(speed_x, speed_y)
+            side_share = (speed_x/half_width)/(speed_x/half_width + speed_y/half_height)
+            found = ~later
+            for offset in range(-4, 5):
+                # The n-th collision is the i-th side collision if i + (top/bottom collisions before it) == n.
+                # Past the i-th side wall the ball has gone past the first top/bottom wall by
+                # walls*2h + rest, where the distance is (to_side + 2w*i)*y_per_x - to_end
+                i = np.maximum(np.floor(n*side_share).astype(np.int64) + offset, 0)
+                walls, rest = utils.linear_divmod(i, _dd_sub(_dd_mul(to_side, y_per_x), to_end),
+                                                  _dd_mul((2*half_width, 0.0), y_per_x), 2*half_height)
+                before = np.where(walls < 0, 0, walls + (rest > 0))  # Sides win ties
+                match = ~found & (i + before == n)
+                x[match] = sign_x*half_width*(-1.0)**(i[match] % 2)
+                y[match] = np.where(walls[match] < 0, sign_y*(rest[match] - half_height),
+                                    sign_y*(-1.0)**(walls[match] % 2)*(half_height - rest[match]))
+                found |= match
+                # Or the j-th top/bottom collision if j + (side collisions up to it) == n
+                j = np.maximum(np.floor(n*(1 - side_share)).astype(np.int64) + offset, 0)
+                walls, rest = utils.linear_divmod(j, _dd_sub(_dd_mul(to_end, x_per_y), to_side),
+                                                  _dd_mul((2*half_height, 0.0), x_per_y), 2*half_width)
+                before = np.where(walls < 0, 0, walls + 1)
+                match = ~found & (j + before == n)
+                y[match] = sign_y*half_height*(-1.0)**(j[match] % 2)
+                x[match] = np.where(walls[match] < 0, sign_x*(rest[match] - half_width),
+                                    sign_x*(-1.0)**(walls[match] % 2)*(half_width - rest[match]))
+                found |= match
+        return np.array([x, y])
+
+    def _rectangle_sampled(self, ball, step=1e-3):
         width, height = self.dims
         # Collision Detection
         collisions_x = [ball.pos[0]]
         collisions_y = [ball.pos[1]]
         max_t = np.sqrt(width**2+height**2)  # Maximum amount of time it would take for a collision to occur
-        t = np.arange(0, 1.1*max_t, 1e-3)
+        t = np.arange(0, 1.1*max_t, step)
         for i in range(self.reflections):
             x_test = ball.pos[0] + ball.vel[0]*t
             y_test = ball.pos[1] + ball.vel[1]*t
@@ -71,7 +291,63 @@ class Table:
         
         self.collisions = [collisions_x, collisions_y]
 
-    def elliptical_calc(self, ball, phase=True):
+    def elliptical_calc(self, ball, phase=True, exact=True, step=1e-3):
+        if not exact:
+            self._elliptical_sampled(ball, phase, step)
+            return
+        self._calc(self._elliptical_run, ball, phase)
+
+    def _elliptical_run(self, ball, out, start, stop, phase=True):
+        a, b = float(self.dims[0]), float(self.dims[1])
+        x, y = float(ball.pos[0]), float(ball.pos[1])
+        vel_x, vel_y = float(ball.vel[0]), float(ball.vel[1])
+        xs, ys, walls = out.x, out.y, out.wall
+        phase_space_x = out.s  # Boundary perimeter from right-most point to collision
+        phase_space_y = out.cos  # Cosine of angle to tangent
+        stats = self.stats
+        lap = perf_counter()
+        for i in range(start, stop):
+            # Solve (x+vel_x*t)^2/a^2 + (y+vel_y*t)^2/b^2 = 1 for the positive root
+            quad_a = (vel_x/a)**2 + (vel_y/b)**2
+            quad_b = 2*(x*vel_x/a**2 + y*vel_y/b**2)
+            quad_c = (x/a)**2 + (y/b)**2 - 1
+            root = math.sqrt(max(quad_b**2 - 4*quad_a*quad_c, 0))
+            if quad_b <= 0:
+                t = (root - quad_b)/(2*quad_a)
+            else:  # Avoid cancellation when the ball is heading outwards
+                t = -2*quad_c/(quad_b + root)
+            x += vel_x*t
+            y += vel_y*t
+            if stats: lap = stats.lap("search", lap)
+            xs[i] = x
+            ys[i] = y
+            walls[i] = 0
+            if stats: lap = stats.lap("store", lap)
+
+            # Change Velocity
+            diff_x = 2*x/(a**2)
+            diff_y = 2*y/(b**2)
+            diff_norm = math.sqrt(diff_x**2 + diff_y**2)
+            norm_x, norm_y = diff_x/diff_norm, diff_y/diff_norm  # Normal unit vector
+            tang_x, tang_y = -norm_y, norm_x  # Tangent unit vector
+            vel_norm = vel_x*norm_x + vel_y*norm_y
+            vel_tang = vel_x*tang_x + vel_y*tang_y
+            vel_x = -vel_norm*norm_x + vel_tang*tang_x
+            vel_y = -vel_norm*norm_y + vel_tang*tang_y
+            if stats: lap = stats.lap("reflection", lap)
+
+            if phase:
+                phase_space_x[i] = math.atan2(a*y, b*x) % math.pi  # Elliptical angle, converted to arc length below
+                phase_space_y[i] = vel_tang/math.sqrt(vel_x**2 + vel_y**2)  # Cosine of tangent angle
+                if stats: lap = stats.lap("phase_space", lap)
+        ball.pos = [x, y]
+        ball.vel = [vel_x, vel_y]
+        if phase:
+            # Find perimeter from right-most point to each collision in one pass
+            phase_space_x[start:stop] = utils.ellipse_arc_length(phase_space_x[start:stop], a, b)
+            if stats: stats.lap("phase_space", lap)
+
+    def _elliptical_sampled(self, ball, phase=True, step=1e-3):
         a, b = self.dims
         # Collision Detection
         collisions_x = [ball.pos[0]]
@@ -79,7 +355,7 @@ class Table:
         phase_space_x = []  # Boundary perimeter from right-most point to collision
         phase_space_y = []  # Cosine of angle to tangent
         max_t = 2*a  # Maximum amount of time it would take for a collision to occur
-        t = np.arange(0, 1.1*max_t, 1e-3)
+        t = np.arange(0, 1.1*max_t, step)
         for i in range(self.reflections):
             x_test = ball.pos[0] + ball.vel[0]*t
             y_test = ball.pos[1] + ball.vel[1]*t
@@ -104,14 +380,91 @@ class Table:
             if elliptical_angle < 0:
                 elliptical_angle += np.pi
             if phase:
-                s = integrate.quad(utils.arc_length, 0, elliptical_angle, args=(a, b))[0]  # Arc length 
+                s = utils.ellipse_arc_length(elliptical_angle, a, b)  # Arc length
                 phase_space_x.append(s)
                 cos_alpha = np.dot(ball.vel, tang_vec)/(np.linalg.norm(ball.vel))  # Cosine of tangent angle
                 phase_space_y.append(cos_alpha)
                 self.phase_space = [phase_space_x, phase_space_y]
             self.collisions = [collisions_x, collisions_y]
 
-    def stadium_calc(self, ball, phase=True):
+    def stadium_calc(self, ball, phase=True, exact=True, step=1e-3):
+        if not exact:
+            self._stadium_sampled(ball, phase, step)
+            return
+        self._calc(self._stadium_run, ball, phase)
+
+    def _stadium_run(self, ball, out, start, stop, phase=True):
+        half_width, end_radius = float(self.dims[0])/2, float(self.dims[1])/2
+        perimeter = 4*half_width + 2*np.pi*end_radius
+        x, y = float(ball.pos[0]), float(ball.pos[1])
+        vel_x, vel_y = float(ball.vel[0]), float(ball.vel[1])
+        xs, ys, walls = out.x, out.y, out.wall
+        arc_length, cos_angle = out.s, out.cos
+        stats = self.stats
+        lap = perf_counter()
+        for i in range(start, stop):
+            # Flat top or bottom, whichever the ball is heading towards
+            t = np.inf
+            in_circle = False
+            if vel_y:
+                t_flat = ((end_radius if vel_y > 0 else -end_radius) - y)/vel_y
+                if t_flat > 0 and abs(x + vel_x*t_flat) <= half_width:
+                    t = t_flat
+            # End semicircles: the far root of |pos + vel*t - centre| = end_radius
+            for centre in (half_width, -half_width):
+                rel_x = x - centre
+                half_b = rel_x*vel_x + y*vel_y
+                disc = half_b**2 - (rel_x**2 + y**2 - end_radius**2)
+                if disc < 0:
+                    continue
+                t_end = math.sqrt(disc) - half_b
+                if 1e-12 < t_end < t and (x + vel_x*t_end - centre)*centre >= 0:
+                    t = t_end
+                    in_circle = True
+                    end_centre = centre
+            if stats: lap = stats.lap("search", lap)
+
+            # Find the point of collision with boundary and change velocity
+            x += vel_x*t
+            if in_circle:
+                y += vel_y*t
+                dist = math.hypot(x - end_centre, y)  # Equal to end_radius up to rounding
+                norm_x, norm_y = (x - end_centre)/dist, y/dist  # Normal unit vector
+                x, y = end_centre + end_radius*norm_x, end_radius*norm_y  # Keep the point on the arc
+                tang_x, tang_y = -norm_y, norm_x  # Tangent unit vector
+                vel_norm = vel_x*norm_x + vel_y*norm_y
+                vel_x -= 2*vel_norm*norm_x
+                vel_y -= 2*vel_norm*norm_y
+                walls[i] = 0 if end_centre > 0 else 2
+            else:  # If collided with top or bottom, reverse y velocity
+                y = end_radius if vel_y > 0 else -end_radius
+                walls[i] = 1 if vel_y > 0 else 3
+                vel_y = -vel_y
+                tang_x, tang_y = 1, 0
+            if stats: lap = stats.lap("reflection", lap)
+            xs[i] = x
+            ys[i] = y
+            if stats: lap = stats.lap("store", lap)
+
+            if phase:
+                cos_angle[i] = vel_x*tang_x + vel_y*tang_y  # Get cosine of angle trajectory makes with tangent
+                # Arc length anticlockwise from the right-most point of the boundary
+                if in_circle:
+                    angle = math.atan2(y, x - end_centre)
+                    if end_centre > 0:
+                        s = end_radius*angle + (perimeter if angle < 0 else 0)
+                    else:
+                        s = 2*half_width + end_radius*(angle % (2*np.pi))
+                elif y > 0:  # Colliding with top
+                    s = np.pi*end_radius/2 + half_width - x
+                else:  # Otherwise, colliding with bottom
+                    s = 3*np.pi*end_radius/2 + 3*half_width + x
+                arc_length[i] = s  # x-axis of phase space plot
+                if stats: lap = stats.lap("phase_space", lap)
+        ball.pos = [x, y]
+        ball.vel = [vel_x, vel_y]
+
+    def _stadium_sampled(self, ball, phase=True, step=1e-3):
         central_width, central_height = self.dims
         end_radius = central_height/2
         
@@ -121,7 +474,7 @@ class Table:
         arc_length = []
         cos_angle = []
         max_t = central_width + central_height  # Maximum amount of time it would take for a collision to occur
-        t = np.arange(0, 1.1*max_t, 1e-3)
+        t = np.arange(0, 1.1*max_t, step)
         for i in range(self.reflections):
             # Work out future x and y values
             x_test = ball.pos[0] + ball.vel[0]*t
@@ -196,16 +549,198 @@ class Table:
             self.phase_space = [arc_length, cos_angle]
         self.collisions = [collisions_x, collisions_y]
 
-    def plot(self, ball, animate=True):
+    def _plugin_run(self, ball, out, start, stop, phase=True):
+        # Generic engine for registered shapes: the shape finds each hit and its outward normal
+        shape = self.shape
+        x, y = float(ball.pos[0]), float(ball.pos[1])
+        vel_x, vel_y = float(ball.vel[0]), float(ball.vel[1])
+        xs, ys, walls, cos_angle = out.x, out.y, out.wall, out.cos
+        stats = self.stats
+        lap = perf_counter()
+        for i in range(start, stop):
+            t, norm_x, norm_y, wall = shape.next_collision(x, y, vel_x, vel_y)
+            if stats: lap = stats.lap("search", lap)
+            x += vel_x*t
+            y += vel_y*t
+            vel_norm = vel_x*norm_x + vel_y*norm_y
+            vel_x -= 2*vel_norm*norm_x
+            vel_y -= 2*vel_norm*norm_y
+            if stats: lap = stats.lap("reflection", lap)
+            xs[i] = x
+            ys[i] = y
+            walls[i] = wall
+            if stats: lap = stats.lap("store", lap)
+            if phase:
+                cos_angle[i] = -vel_x*norm_y + vel_y*norm_x  # Component along the anticlockwise tangent
+                if stats: lap = stats.lap("phase_space", lap)
+        if phase:
+            # Arc lengths for the whole run at once, since the shape may only know them numerically
+            out.s[start:stop] = shape.arc_length(xs[start:stop], ys[start:stop], walls[start:stop])
+            if stats: lap = stats.lap("phase_space", lap)
+        ball.pos = [x, y]
+        ball.vel = [vel_x, vel_y]
+
+    def stream(self, ball, chunk_size=10000, phase=True, reflections=None):
+        """Yield the trajectory chunk by chunk as Trajectory objects.
+
+        Each chunk holds up to chunk_size new collisions (phase-space columns are NaN
+        for rectangles). The ball is advanced as chunks are consumed, so memory stays
+        constant; with reflections=None the stream never ends.
+        """
+        run = self._engine()
+        remaining = reflections
+        while remaining is None or remaining > 0:
+            n = chunk_size if remaining is None else min(chunk_size, remaining)
+            chunk = self._new_trajectory(n)
+            self._run(run, ball, chunk, 0, n, phase)
+            yield chunk
+            if remaining is not None:
+                remaining -= n
+
+    def record(self, ball, path, chunk_size=100000, phase=True):
+        """Simulate self.reflections collisions straight into a memory-mapped trajectory file.
+
+        Only one chunk of pages needs to be resident at a time, so run length is limited by
+        disk rather than memory. The file header records the table and initial conditions.
+        """
+        run = self._engine()
+        header = {"geometry": self.geometry, "dims": self.dims.tolist(), "init_pos": [float(p) for p in ball.pos],
+                  "angle": float(ball.angle), "reflections": self.reflections, "phase": phase and self.geometry != "rectangle"}
+        trajectory = Trajectory.create(path, self.reflections + 1, header)
+        trajectory.x[0], trajectory.y[0] = ball.pos
+        for start in range(1, self.reflections + 1, chunk_size):
+            self._run(run, ball, trajectory, start, min(start + chunk_size, self.reflections + 1), phase)
+            trajectory.flush()
+        self.trajectory = trajectory
+        self.collisions = trajectory.collisions
+        if header["phase"]:
+            self.phase_space = trajectory.phase_space
+
+    @classmethod
+    def load(cls, path):
+        """Open a trajectory file written by Table.record for analysis or plotting without re-simulating."""
+        trajectory = Trajectory.open(path)
+        table = cls(trajectory.header["geometry"], dims=trajectory.header["dims"])
+        table.reflections = len(trajectory) - 1
+        table.trajectory = trajectory
+        table.collisions = trajectory.collisions
+        if trajectory.header["phase"]:
+            table.phase_space = trajectory.phase_space
+        return table
+
+    def ensemble_calc(self, balls, phase=True):
+        """Advance every ball of an Ensemble by self.reflections collisions at once.
+
+        Returns (collisions, phase_space): collisions has shape (2, reflections+1, N)
+        and includes the starting positions; phase_space has shape (2, reflections, N)
+        and is empty for rectangles or when phase is False. Registered shapes only find one
+        ball's next hit at a time, so their balls are run one after another by the shape's engine.
+        """
+        if self.shape is not None:
+            return self._ensemble_plugin(balls, phase)
+        step = ensemble.STEPS[self.geometry]
+        phase_calc = ensemble.PHASES.get(self.geometry) if phase else None
+        dims = self.dims.astype(float)
+        x, y = balls.pos[:, 0].copy(), balls.pos[:, 1].copy()
+        vel_x, vel_y = balls.vel[:, 0].copy(), balls.vel[:, 1].copy()
+        collisions = np.empty((2, self.reflections + 1, len(x)))
+        collisions[:, 0] = x, y
+        phase_space = np.empty((2, self.reflections if phase_calc else 0, len(x)))
+        for i in range(self.reflections):
+            x, y, vel_x, vel_y = step(dims, x, y, vel_x, vel_y)
+            collisions[:, i + 1] = x, y
+            if phase_calc:
+                phase_space[:, i] = phase_calc(dims, x, y, vel_x, vel_y)
+        balls.pos = np.column_stack([x, y])
+        balls.vel = np.column_stack([vel_x, vel_y])
+        return collisions, phase_space
+
+    def _ensemble_plugin(self, balls, phase):
+        collisions = np.empty((2, self.reflections + 1, len(balls.pos)))
+        phase_space = np.empty((2, self.reflections if phase else 0, len(balls.pos)))
+        out = Trajectory(self.reflections + 1)
+        for i, (pos, vel) in enumerate(zip(balls.pos, balls.vel)):
+            single = _Moving(pos, vel)
+            out.x[0], out.y[0] = pos
+            self._run(self._plugin_run, single, out, 1, self.reflections + 1, phase)
+            collisions[:, :, i] = out.x, out.y
+            if phase:
+                phase_space[:, :, i] = out.s[1:], out.cos[1:]
+            balls.pos[i], balls.vel[i] = single.pos, single.vel
+        return collisions, phase_space
+
+    def s_max(self):
+        # Largest phase-space arc length: the stadium perimeter, or half the ellipse perimeter
+        # since the elliptical angle is taken modulo pi
+        if self.shape is not None:
+            return self.shape.s_max()
+        if self.geometry == "elliptical":
+            return float(utils.ellipse_arc_length(np.pi, *self.dims.astype(float)))
+        return 2*float(self.dims[0]) + np.pi*float(self.dims[1])
+
+    def plot(self, ball=None, animate=True, frame_budget=500, max_history=20000, interval=40, phase_mode="auto", bins=(400, 200)):
+        # Plotting dependencies are only imported here so compute-only runs start quickly
+        import matplotlib.pyplot as plt
+        from matplotlib import animation
+        fig = plt.figure()
+        updater = self._draw(fig, ball, animate, frame_budget, max_history, phase_mode, bins)
+        if updater is not None:
+            ani = animation.FuncAnimation(fig, updater, updater.frames, interval=interval, blit=True, repeat=False)
+        plt.show()
+
+    def export(self, path, ball=None, dpi=100, figsize=(6.4, 4.8), frame_budget=500, frame_skip=1, fps=25,
+               max_history=20000, phase_mode="auto", bins=(400, 200)):
+        """Render the plot offscreen with the Agg canvas, without needing a display.
+
+        Image paths (.png, .pdf, .svg, ...) get the full trajectory, thinned to at most max_history
+        whole flights for long runs; .mp4 and .gif paths get the animation, drawn in at most
+        frame_budget frames of which every frame_skip-th is written (the last frame is always
+        kept). .mp4 output needs ffmpeg to be installed.
+        """
+        if frame_skip < 1:
+            raise ValueError(f"frame_skip must be a positive integer, not {frame_skip}")
+        import matplotlib
+        from matplotlib import animation
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.figure import Figure
+        fig = Figure(figsize=figsize)
+        FigureCanvasAgg(fig)
+        animate = path.lower().endswith((".mp4", ".gif"))
+        with matplotlib.rc_context({"agg.path.chunksize": 10000}):  # Lets Agg draw paths with millions of vertices
+            updater = self._draw(fig, ball, animate, frame_budget, max_history, phase_mode, bins)
+            if updater is None:
+                fig.savefig(path, dpi=dpi, facecolor=fig.get_facecolor())
+                return
+            frames = list(range(0, updater.frames, frame_skip))
+            if frames[-1] != updater.frames - 1:
+                frames.append(updater.frames - 1)
+            writer = animation.PillowWriter(fps=fps) if path.lower().endswith(".gif") else animation.FFMpegWriter(fps=fps)
+            with writer.saving(fig, path, dpi):  # Drive the writer directly so each frame is drawn only once
+                for frame in frames:
+                    updater(frame)
+                    writer.grab_frame(facecolor=fig.get_facecolor())
+
+    def _draw(self, fig, ball, animate, frame_budget, max_history, phase_mode, bins):
+        # Draws the table, trajectory and phase space onto fig; returns the animation updater if animating
+        from matplotlib.patches import Rectangle
+        from src import render
         if self.phase_space:
-            fig, (ax, ax2) = plt.subplots(2, 1)
+            ax, ax2 = fig.subplots(2, 1)
             ax2.set_title(f"Phase Space")
-            ax2.scatter(self.phase_space[0], self.phase_space[1])
+            if phase_mode == "density" or (phase_mode == "auto" and len(self.phase_space[0]) > 100000):
+                density = render.PhaseDensity(self.s_max(), bins)
+                if self.trajectory is not None:
+                    density.add_trajectory(self.trajectory)  # Reads memory-mapped trajectories a chunk at a time
+                else:
+                    density.add(*self.phase_space)
+                density.show(ax2)
+            else:
+                ax2.scatter(self.phase_space[0], self.phase_space[1])
             ax2.set_xlabel("$s$")
             ax2.set_ylabel(r"$\cos{\theta}$")
             ax2.set_aspect("equal")
         else:
-            fig, ax = plt.subplots()
+            ax = fig.subplots()
         if self.geometry == "rectangle":
             ax.add_patch(Rectangle((-self.dims[0]/2, -self.dims[1]/2), self.dims[0], self.dims[1], fill=False, edgecolor='black', lw=3))  # Draw billiards table
             ax.set_xlim([1.1*-self.dims[0]/2, 1.1*self.dims[0]/2])
@@ -218,6 +753,11 @@ class Table:
             ax.set_xlim([1.1*-self.dims[0], 1.1*self.dims[0]])
             ax.set_ylim([1.1*-self.dims[1], 1.1*self.dims[1]])
             ax2.set_ylim([-1, 1])
+        elif self.shape is not None:
+            x, y = self.shape.outline()
+            ax.plot(x, y, color="k")
+            ax.set_xlim([1.1*np.nanmin(x), 1.1*np.nanmax(x)])
+            ax.set_ylim([1.1*np.nanmin(y), 1.1*np.nanmax(y)])
         else:
             # Top and Bottom Lines
             top_bottom = np.linspace(-self.dims[0]/2, self.dims[0]/2, 100)
@@ -234,14 +774,42 @@ class Table:
             y_left = self.dims[1]/2 * np.sin(theta+np.pi)
             ax.plot(x_left, y_left, color="k")
 
-        line, = ax.plot(self.collisions[0], self.collisions[1])
+        updater = None
         if animate:
-            ani = animation.FuncAnimation(fig, utils.update, len(self.collisions[0]), interval= 50*100/self.reflections, fargs=[self.collisions[0], self.collisions[1], line], blit=True, repeat=False)
-        ax.scatter(ball.init_pos[0], ball.init_pos[1], marker='o', s=50, color="r", zorder=3, label="Initial Position")  # Plot starting position
+            # Draw the trajectory in at most frame_budget frames, batching collisions as needed
+            updater = render.IncrementalTrajectory(ax, np.asarray(self.collisions[0]), np.asarray(self.collisions[1]), frame_budget, max_history)
+        elif len(self.collisions[0]) - 1 > max_history:
+            # Every stride-th flight, as on the last frame of the animation, rather than millions of chords
+            xs, ys = np.asarray(self.collisions[0]), np.asarray(self.collisions[1])
+            ax.plot(*render.flights(xs, ys, np.arange(0, len(xs) - 1, math.ceil((len(xs) - 1)/max_history))))
+        else:
+            ax.plot(self.collisions[0], self.collisions[1])
+        init_pos = ball.init_pos if ball is not None else (self.collisions[0][0], self.collisions[1][0])
+        ax.scatter(init_pos[0], init_pos[1], marker='o', s=50, color="r", zorder=3, label="Initial Position")  # Plot starting position
         # Plot Styling & Titles
         ax.set_title(f"Trajectories of a Mathematical Billiard Ball\n in a {self.geometry.title()} Geometry ({self.reflections} Collisions)")
         ax.set_xlabel("$x$ Position")
         ax.set_ylabel("$y$ Position")
         fig.set_facecolor('lightgrey')
         ax.legend()
-        plt.show()
\ No newline at end of file
+        return updater
+
+class _Moving:
+    # Position and velocity of one ensemble ball, in the form the single-ball engines update
+    def __init__(self, pos, vel):
+        self.pos, self.vel = pos, vel
+
+def _ratio(a, b):
+    # a/b as an unevaluated float pair
+    quotient = a/b
+    product, error = utils.two_product(quotient, b)
+    return quotient, ((a - product) - error)/b
+
+def _dd_mul(a, b):
+    # Product of two unevaluated float pairs
+    product, error = utils.two_product(a[0], b[0])
+    return utils.two_sum(product, error + a[0]*b[1] + a[1]*b[0])
+
+def _dd_sub(a, b):
+    difference, error = utils.two_sum(a[0], -b[0])
+    return utils.two_sum(difference, error + a[1] - b[1])
@@ -0,0 +1,100 @@
+import json
+import numpy as np
+
+# One record per collision; wall numbers go anticlockwise from the right-most point of the table
+# (rectangle: right, top, left, bottom; stadium: right end, top, left end, bottom; ellipse: 0;
+# polygon: edge index). The starting position is stored with wall -1 and no phase-space values.
+TRAJECTORY_DTYPE = np.dtype([("x", "f8"), ("y", "f8"), ("s", "f8"), ("cos", "f8"), ("wall", "i4")])
+START = -1
+# Bumped whenever the record layout changes; version 1 files (no version in the header) stored wall as i1
+VERSION = 2
+
+# On-disk layout: magic, header length (little-endian uint32), JSON header padded to a multiple of 64 bytes, records
+MAGIC = b"BILLIARD"
+HEADER_ALIGN = 64
+
+class Trajectory:
+    """Preallocated, array-backed store of collision points and phase-space values.
+
+    The columns (x, y, s, cos, wall) are views into a single record array, so the
+    engines write into them directly and plotting or export takes them without copying.
+    """
+    def __init__(self, length=0, records=None, header=None):
+        if records is None:
+            records = np.zeros(length, dtype=TRAJECTORY_DTYPE)
+            records["s"] = records["cos"] = np.nan
+            records["wall"] = START
+        self.records = records
+        self.header = header or {}
+
+    @classmethod
+    def create(cls, path, length, header):
+        """Create a trajectory file of length records and map it into memory for writing.
+
+        header is a JSON-serialisable dict describing the run (geometry, dims, initial conditions).
+        """
+        header = dict(header, version=VERSION)
+        header_bytes = json.dumps(header).encode("utf-8")
+        header_bytes += b" "*(-(len(MAGIC) + 4 + len(header_bytes)) % HEADER_ALIGN)
+        with open(path, "wb") as f:
+            f.write(MAGIC)
+            f.write(len(header_bytes).to_bytes(4, "little"))
+            f.write(header_bytes)
+        records = np.memmap(path, dtype=TRAJECTORY_DTYPE, mode="r+", offset=len(MAGIC) + 4 + len(header_bytes), shape=(length,))
+        trajectory = cls(records=records, header=header)
+        trajectory.s[:] = trajectory.cos[:] = np.nan
+        trajectory.wall[:] = START
+        return trajectory
+
+    @classmethod
+    def open(cls, path, mode="r"):
+        """Map an existing trajectory file lazily; records are only read from disk when used."""
+        with open(path, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path} is not a billiards trajectory file")
+            header_length = int.from_bytes(f.read(4), "little")
+            header = json.loads(f.read(header_length))
+        if header.get("version", 1) != VERSION:
+            raise ValueError(f"{path} is a version {header.get('version', 1)} trajectory file; only version {VERSION} is supported")
+        records = np.memmap(path, dtype=TRAJECTORY_DTYPE, mode=mode, offset=len(MAGIC) + 4 + header_length)
+        return cls(records=records, header=header)
+
+    def flush(self):
+        if isinstance(self.records, np.memmap):
+            self.records.flush()
+
+    def __len__(self):
+        return len(self.records)
+
+    def __getitem__(self, index):
+        return Trajectory(records=self.records[index], header=self.header)
+
+    @property
+    def x(self):
+        return self.records["x"]
+
+    @property
+    def y(self):
+        return self.records["y"]
+
+    @property
+    def s(self):
+        return self.records["s"]
+
+    @property
+    def cos(self):
+        return self.records["cos"]
+
+    @property
+    def wall(self):
+        return self.records["wall"]
+
+    @property
+    def collisions(self):
+        return [self.x, self.y]
+
+    @property
+    def phase_space(self):
+        # Skip the starting position, which has no phase-space values
+        first = 1 if len(self) and self.wall[0] == START else 0
+        return [self.s[first:], self.cos[first:]]
@@ -1,8 +1,8 @@
-from time import sleep
 import sys
 import numpy as np
 
 def input_test(question, integer=True, positive=False):
+    from time import sleep  # Only needed for interactive use
     while True:
         user_input = input(question)
         if user_input.lower() == "q":
@@ -23,48 +23,96 @@ def input_test(question, integer=True, positive=False):
                 break
     return user_input
 
-def update(num, collisions_x, collisions_y, line):
-    """Plot Update Function
-    
-    Animates plotting of trajectories.
-    
+def ellipse_arc_length(angle, a, b):
+    """Arc Length of Ellipse
+
+    Arc length of the ellipse from right-most point to point of collision, as the incomplete elliptic
+    integral of the second kind. Works on arrays of angles, so every collision is converted at once.
+    The point at elliptical angle t is (a cos t, b sin t), so ds = sqrt(a^2 sin^2 t + b^2 cos^2 t) dt.
+    (Earlier versions integrated sqrt(a^2 cos^2 t + b^2 sin^2 t), which only agrees at the ends of
+    each quarter; s values of elliptical runs saved before this change differ, though s_max does not.)
+
     Parameters
     ----------
-        num: int
-            serves as an incrementer
-        collisions_x: 1D array
-            x coordinates of collision points
-        collisions_y: 1D array
-            y coordinates of collision points
-        line: matplotlib object
-            line of the matplotlib plot
-    
+        angle: float or array
+            elliptical angle in radians
+        a: float
+            semi-major axis of the ellipse
+        b: float
+           semi-minor axis of the ellipse
+
     Returns
     -------
-        line: matplotlib object
-            updated line for matplotlib plot
+        s: float or array
+            arc length of the ellipse up to each angle
     """
-    line.set_data(collisions_x[:num+1], collisions_y[:num+1])
-    return line,
+    from scipy import special  # Imported on first use so runs without phase space never load scipy
+    s = b*special.ellipeinc(angle, 1 - (a/b)**2)
+    return s
+
+def two_sum(a, b):
+    """Sum of two floats as an unevaluated pair (s, e) with s + e = a + b exactly (Knuth)."""
+    s = a + b
+    b_virtual = s - a
+    return s, (a - (s - b_virtual)) + (b - b_virtual)
+
+def _split(a):
+    # Veltkamp split of a double into two halves of at most 26 significant bits each
+    c = 134217729.0*a  # 2**27 + 1
+    high = c - (c - a)
+    return high, a - high
+
+def two_product(a, b):
+    """Product of two floats as an unevaluated pair (p, e) with p + e = a*b exactly (Dekker)."""
+    p = a*b
+    a_high, a_low = _split(a)
+    b_high, b_low = _split(b)
+    return p, ((a_high*b_high - p) + a_high*b_low + a_low*b_high) + a_low*b_low
+
+def linear_divmod(k, offset, step, modulus):
+    """Exact Division of a Linear Progression
+
+    Splits offset + k*step into quotient*modulus + remainder without ever forming the (possibly
+    huge) product k*step, so the remainder keeps full precision however large k gets. k is split
+    into 26-bit halves and step into Veltkamp halves, making every partial product exact, and each
+    is reduced with the exact floating-point remainder before anything is rounded.
 
-def arc_length(angle, a, b):  
-    """Arc Length of Ellipse 
-    
-    Integrated to calculate arc length of the ellipse from right-most point to point of collision.
-    
     Parameters
     ----------
-        angle: float
-            elliptical angle in radians 
-        a: float
-            semi-major axis of the ellipse
-        b: float
-           semi-minor axis of the ellipse
-    
+        k: int array
+            non-negative integer multipliers, below 2**53
+        offset: (float, float)
+            offset as an unevaluated sum of a float and a small correction
+        step: (float, float)
+            non-negative step as an unevaluated sum of a float and a small correction
+        modulus: float
+            positive modulus
+
     Returns
     -------
-        f: float
-            integrand of ellpise arc length calculation
+        quotient: int64 array
+            number of whole moduli in offset + k*step (negative if the sum is negative)
+        remainder: float array
+            what is left over, between 0 and modulus
     """
-    f = np.sqrt((a*np.cos(angle))**2+(b*np.sin(angle))**2)
-    return f
\ No newline at end of file
+    k = np.asarray(k, dtype=np.int64)
+    k_high, k_low = (k >> 26).astype(float)*2.0**26, (k & (2**26 - 1)).astype(float)
+    step_high, step_low = _split(step[0])
+    quotient = np.zeros(k.shape, dtype=np.int64)
+    # The remainder is kept as an unevaluated pair, so a sum that is a hair either side of a
+    # multiple of the modulus is not rounded onto it and assigned to the wrong quotient
+    remainder, error = np.zeros(k.shape), np.zeros(k.shape)
+    for part in (k_high*step_high, k_high*step_low, k_low*step_high, k_low*step_low, offset[0]):  # All exact
+        part_remainder = np.fmod(part, modulus)  # fmod is exact
+        quotient += np.rint((part - part_remainder)/modulus).astype(np.int64)
+        remainder, part_error = two_sum(remainder, part_remainder)
+        error += part_error
+    remainder, error = two_sum(remainder, error + (offset[1] + k.astype(float)*step[1]))
+    for _ in range(2):  # Take out whole moduli, then fix up a remainder a hair outside [0, modulus)
+        whole = np.floor(remainder/modulus)
+        whole -= (whole*modulus == remainder) & (error < 0)
+        quotient += whole.astype(np.int64)
+        product, product_error = two_product(whole, modulus)
+        remainder, sum_error = two_sum(remainder, -product)
+        remainder, error = two_sum(remainder, error + sum_error - product_error)
+    return quotient, np.clip(remainder, 0, modulus)